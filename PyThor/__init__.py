@@ -2,5 +2,5 @@ import PyThor.app_pythor
 import PyThor.config
 import PyThor.data
 import PyThor.utilities
-from PyThor.app_pythor import runPythor,app
+from PyThor.app_pythor import runPythor,servePythor,app
 from PyThor.config.config import Config
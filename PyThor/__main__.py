@@ -4,6 +4,15 @@ from PyThor import PyThor
 parser = ArgumentParser(description="PyThor: A tool to download and interpolate weather forecasts. Default address: 127.0.0.1 and port: 5000")
 parser.add_argument("-a","--address", help="Endpoint address", type=str)
 parser.add_argument("-p","--port", help="Endpoint port", type=int)
-args = parser.parse_args()
+parser.add_argument("--production", help="Serve with a production server using several worker processes", action="store_true")
+parser.add_argument("-w","--workers", help="Number of worker processes of the production server", type=int)
+parser.add_argument("-t","--threads", help="Number of threads of every production worker process", type=int)
+
+if __name__ == "__main__":
+    # the guard keeps worker processes of the interpolation pool from starting the server again
+    args = parser.parse_args()
+    if args.production:
+        PyThor.servePythor(args.address, args.port, args.workers, args.threads)
+    else:
+        PyThor.runPythor(args.address, args.port)
 
-PyThor.runPythor(args.address, args.port)
@@ -1,16 +1,22 @@
 import atexit
 import os
-import json
 
-from flask import Flask, request, Response
+import numpy as np
+from flask import Flask, request, Response, jsonify
 
-from PyThor.config.config import Config, cache_folder
+from PyThor.config.config import Config, cache_folder, jobs_folder
 
 config = Config()
 
+from PyThor.data.coverage import CoverageIndex, coverage_index
 from PyThor.data.data_request import DataRequest
 from PyThor.data.fetcher import Fetcher
 from PyThor.data.interpolation import interpolate
+from PyThor.data.jobs import JobQueue
+from PyThor.data.prefetch import Prefetcher
+from PyThor.data.result_cache import result_cache, encode
+from PyThor.data.single_flight import single_flight, hold_lock
+from PyThor.utilities.files import rm_grib_files, rm_cache_files
 
 
 app = Flask(__name__)
@@ -21,38 +27,203 @@ def index():
     return "PyThor is working"
 
 
+def fetch_and_interpolate(data_request, time, progress=None):
+    """
+    fetch and interpolate the data of a request, results with all sources available are stored in the cache
+    :param data_request: DataRequest
+    :param time: [start, end] of the request as unix timestamps
+    :param progress: optional function called with the name of every stage started
+    :return: JSON encoded interpolated data, or None if no source could be fetched
+    """
+    if progress is not None:
+        progress("fetching")
+    result = Fetcher(data_request).fetch()
+    if result["waves_and_wind"] is None and not result["copernicus"]:
+        return None
+
+    if progress is not None:
+        progress("interpolating")
+    weather = interpolate(result, data_request, time)
+    if progress is not None:
+        progress("serializing")
+    missing = result["waves_and_wind"]["missing"] if result["waves_and_wind"] is not None else []
+    if missing:
+        # hours of NOAA data that could not be downloaded or decoded, as unix timestamps
+        weather["missing_hours"] = np.array(missing, dtype="int64")
+    if result["errors"] or missing:
+        # results missing some of the sources or some hours of data are not cached
+        return b"".join(encode(weather))
+
+    key, coverage = data_request.cache_key(), CoverageIndex.coverage(data_request, result, weather)
+    res = result_cache.save(key, weather, data_request.get_time()[1].timestamp(), coverage)
+    coverage_index.add(key, coverage)
+    return res
+
+
+prefetcher = None
+if config.settings["prefetch"]["active"]:
+    prefetcher = Prefetcher(config.settings["prefetch"]["regions"], fetch_and_interpolate,
+                            config.settings["prefetch"]["horizon"], config.settings["prefetch"]["availability_delay"],
+                            config.settings["prefetch"]["poll_interval"], config.settings["prefetch"]["max_workers"])
+
+
+@app.route('/api/prefetch')
+def prefetch_status():
+    if prefetcher is None:
+        return Response(status=404)
+    return jsonify(prefetcher.report())
+
+
+def parse_request() -> DataRequest:
+    return DataRequest(request.args.get('latitude_start'), request.args.get('latitude_end'),
+                       request.args.get('longitude_start'), request.args.get('longitude_end'),
+                       request.args.get('time_start'), request.args.get('time_end'),
+                       request.args.get('interval', 60),
+                       request.args.get('variables', "").replace(" ", "").split(","))
+
+
+def compute(data_request, time, progress=None):
+    """
+    get the result of a request from the cache, or fetch and interpolate it
+    :param data_request: valid DataRequest
+    :param time: [start, end] of the request as unix timestamps
+    :param progress: optional function called with the name of every stage started
+    :return: JSON encoded result, or None if no source could be fetched
+    """
+    key = data_request.cache_key()
+    print("Checking cache...")
+    # requests inside the area, time range and variables of a cached result are sliced from it
+    res = result_cache.load(key) or coverage_index.serve(data_request)
+    if res is None:
+        # identical requests arriving meanwhile wait here and are served from the cache afterwards
+        with single_flight.claim(key):
+            res = result_cache.load(key) or coverage_index.serve(data_request)
+            if res is None:
+                print("Cache miss")
+                return fetch_and_interpolate(data_request, time, progress)
+    print("Cache hit")
+    return res
+
+
+job_queue = JobQueue(jobs_folder, compute, config.settings["jobs"]["max_workers"],
+                     config.settings["jobs"]["max_jobs"], config.settings["jobs"]["ttl"])
+
+
 @app.route('/api/weather')
 def root():
-    data_request = DataRequest(request.args.get('latitude_start'), request.args.get('latitude_end'),
-                               request.args.get('longitude_start'), request.args.get('longitude_end'),
-                               request.args.get('time_start'), request.args.get('time_end'),
-                               request.args.get('interval', 60),
-                               request.args.get('variables', "").replace(" ", "").split(","))
-    file_name = str(data_request) + ".json"
-    print("Checking cache folder...")
-    print(cache_folder / file_name)
-    if not os.path.isfile(cache_folder / file_name):
-        print("Cache miss")
-        time = [int(request.args.get('time_start')), int(request.args.get('time_end'))]
-        if not data_request.is_valid():
-            return Response(status=400)
-        result = Fetcher(data_request).fetch()
-
-        res = interpolate(result, data_request, time)
-
-        with open(cache_folder / file_name, 'w') as f:
-            json.dump(res, f)
-        return res
-    else:
-        print("Cache hit")
-        with open(cache_folder / file_name, 'r') as f:
-            return json.load(f)
+    data_request = parse_request()
+    if not data_request.is_valid():
+        return Response(status=400)
+    time = [int(request.args.get('time_start')), int(request.args.get('time_end'))]
+    res = compute(data_request, time)
+    if res is None:
+        return Response(status=502)
+    return Response(res, mimetype="application/json")
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data_request = parse_request()
+    if not data_request.is_valid():
+        return Response(status=400)
+    time = [int(request.args.get('time_start')), int(request.args.get('time_end'))]
+    job = job_queue.submit(data_request, time)
+    if job is None:
+        return Response(status=503)
+    return jsonify(job), 202, {"Location": f"/api/jobs/{job['id']}"}
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return Response(status=404)
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return Response(status=404)
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return Response(status=404)
+    res = job_queue.result(job_id)
+    if res is None:
+        # not finished yet, failed or cancelled
+        return jsonify(job), 409
+    return Response(res, mimetype="application/json")
+
+
+_prefetch_lock = None
+
+
+def startPrefetcher():
+    """
+    start the prefetcher if it is active, in a single process when several server processes share the caches
+    """
+    global _prefetch_lock
+    if prefetcher is None or _prefetch_lock is not None:
+        return
+    _prefetch_lock = hold_lock(cache_folder / "prefetch.lock")
+    if _prefetch_lock is not None:
+        prefetcher.start()
 
 
 def runPythor(host="127.0.0.1", port=5000):
+    startPrefetcher()
     app.run(host=host, port=port)
 
 
+def servePythor(host="127.0.0.1", port=5000, workers=None, threads=None):
+    """
+    serve PyThor with a production WSGI server: gunicorn with worker processes forked after the application
+    is imported, so they start fast and share its memory copy-on-write, each serving requests with threads.
+    Windows has no fork, there waitress serves all requests with threads of a single process
+    :param workers: number of worker processes, the server section of the config by default
+    :param threads: number of threads of every worker process, the server section of the config by default
+    """
+    host, port = host or "127.0.0.1", port or 5000
+    workers = workers or config.settings["server"]["workers"]
+    threads = threads or config.settings["server"]["threads"]
+    if os.name == "nt":
+        import waitress
+        if workers > 1:
+            print("Multiple worker processes are not supported on Windows, serving with threads of one process")
+        startPrefetcher()
+        waitress.serve(app, host=host, port=port, threads=threads)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        # the cache and the downloaded files are shared, only the main process deletes them on exit
+        atexit.unregister(rm_grib_files)
+        atexit.unregister(rm_cache_files)
+
+    def post_worker_init(worker):
+        startPrefetcher()
+
+    class Server(BaseApplication):
+        def load_config(self):
+            options = {"bind": f"{host}:{port}", "workers": workers, "threads": threads,
+                       "worker_class": "gthread", "preload_app": True, "timeout": config.settings["server"]["timeout"],
+                       "post_fork": post_fork, "post_worker_init": post_worker_init}
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
 if __name__ == '__main__':
     runPythor()
 # print(fetch_wave(0, 0))
@@ -8,6 +8,10 @@ config_file = package / "config.yaml"
 config_schema = package / "config_schema.yaml"
 save_folder = package / "Downloaded_data"
 cache_folder = package / "Cache"
+weights_folder = package / "Weights"
+masks_folder = package / "Masks"
+raw_folder = package / "Raw"
+jobs_folder = package / "Jobs"
 
 
 class Config:
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import xarray as xr
+
+from PyThor.app_pythor import config
+
+# the copernicus toolbox reads its HTTP timeout when imported, bound its requests like the NOAA downloads
+os.environ.setdefault("COPERNICUSMARINE_HTTPS_TIMEOUT", str(config.settings["fetching"]["timeout"]))
+os.environ.setdefault("COPERNICUSMARINE_HTTPS_RETRIES", str(config.settings["fetching"]["retries"]))
+import copernicusmarine  # noqa: E402
+
+
+class CopernicusSession:
+    """
+    A class owned by the server process that authenticates to copernicus marine once per dataset and keeps
+    the lazily opened datasets with their catalogue metadata, shared by all Fetcher instances.
+    Datasets are reopened after the ttl, so new forecast steps show up in their time axis
+    """
+
+    def __init__(self, username, password, ttl):
+        self.username = username
+        self.password = password
+        self.ttl = ttl
+        self._datasets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __dataset_lock(self, dataset_id) -> threading.Lock:
+        with self._lock:
+            if dataset_id not in self._locks:
+                self._locks[dataset_id] = threading.Lock()
+            return self._locks[dataset_id]
+
+    def dataset(self, dataset_id) -> xr.Dataset:
+        """
+        get the whole dataset, opened lazily so only the parts selected later are downloaded
+        :param dataset_id: copernicus dataset id
+        :return: lazy xarray dataset
+        """
+        with self.__dataset_lock(dataset_id):
+            opened = self._datasets.get(dataset_id)
+            if opened is None or time.monotonic() - opened[0] > self.ttl:
+                print(f"Opening {dataset_id}...")
+                dataset = copernicusmarine.open_dataset(dataset_id=dataset_id, username=self.username,
+                                                        password=self.password)
+                opened = (time.monotonic(), dataset)
+                self._datasets[dataset_id] = opened
+            return opened[1]
+
+    def metadata(self, dataset_id) -> dict:
+        """
+        :param dataset_id: copernicus dataset id
+        :return: catalogue metadata of the dataset, see dataset_metadata
+        """
+        return dataset_metadata(self.dataset(dataset_id))
+
+    def invalidate(self, dataset_id=None):
+        """
+        forget an opened dataset, or all of them, so it is reopened on the next use
+        """
+        with self._lock:
+            if dataset_id is None:
+                self._datasets.clear()
+            else:
+                self._datasets.pop(dataset_id, None)
+
+
+def dataset_metadata(dataset) -> dict:
+    """
+    :param dataset: xarray dataset
+    :return: a dict structured like:
+        - latitude, longitude : coordinates of the grid
+        - time : time axis as numpy datetime64 array
+        - variables : dict of the standard name of every variable by variable name
+    """
+    return {"latitude": dataset["latitude"].values, "longitude": dataset["longitude"].values,
+            "time": dataset["time"].values,
+            "variables": {name: data.attrs.get("standard_name", name) for name, data in dataset.data_vars.items()}}
+
+
+copernicus_session = CopernicusSession(config.settings["coppernicus_acount"]["username"],
+                                       config.settings["coppernicus_acount"]["password"],
+                                       config.settings["fetching"]["metadata_ttl"])
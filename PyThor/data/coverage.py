@@ -0,0 +1,167 @@
+import threading
+import time
+
+import numpy as np
+
+from PyThor.app_pythor import config
+from PyThor.data.interpolation import output_axis, get_data, get_copernicus_data
+from PyThor.data.result_cache import result_cache, encode
+
+AXES = ("time_inter", "lat_inter", "lon_inter", "grid_latitude", "grid_longitude")
+# largest difference in degrees between cached and requested output coordinates considered the same point
+GRID_TOLERANCE = 1e-9
+
+
+def grid_source(data_request) -> str:
+    """
+    name of the source whose grid the output grid of a request is built from, the first one interpolated
+    :param data_request: DataRequest
+    :return: waves_and_wind, tides, currents or wind
+    """
+    if config.settings["noaa_active"] is True and len(data_request.noaa_variables) > 0:
+        return "waves_and_wind"
+    if len(data_request.tide_variables) > 0:
+        return "tides"
+    if data_request.currents_variables != [[], []]:
+        return "currents"
+    return "wind"
+
+
+def aligned(cached, requested):
+    """
+    find the points of a cached output axis making up the output axis of a request
+    :param cached: cached output coordinate axis
+    :param requested: output coordinate axis a direct computation of the request would return
+    :return: indices into the cached axis, or None if the requested axis is not part of it
+    """
+    start = np.searchsorted(cached, requested[0] - GRID_TOLERANCE)
+    idx = np.arange(start, start + len(requested))
+    if idx[-1] >= len(cached) or np.abs(cached[idx] - requested).max() > GRID_TOLERANCE:
+        return None
+    return idx
+
+
+class CoverageIndex:
+    """
+    A class indexing the area, output grid, time axis and variables of the cached results,
+    so a request covered by a cached result is answered by slicing it instead of fetching and interpolating.
+    A result is only sliced when the output grid of the request, built from the source grid of the result,
+    is part of the cached grid, so the answer is on the grid a direct computation returns
+    """
+
+    def __init__(self, cache, refresh_interval):
+        """
+        :param cache: ResultCache holding the results
+        :param refresh_interval: minimum seconds between scans of the results stored on disk by other processes
+        """
+        self.cache = cache
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._scanned = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def coverage(data_request, fetched, result) -> dict:
+        """
+        describe what a result covers
+        :param data_request: DataRequest of the result
+        :param fetched: dict returned by Fetcher.fetch, holding the source grid the output grid was built from
+        :param result: dict of numpy arrays returned by interpolate
+        """
+        coordinates = data_request.get_coordinates()
+        if fetched["waves_and_wind"] is not None:
+            lat, lon, _ = get_data(fetched["waves_and_wind"])
+        else:
+            lat, lon, _ = get_copernicus_data(next(iter(fetched["copernicus"].values())))
+        # only the source points inside the area are needed to rebuild the output grid of a request inside it
+        lat = lat[(lat >= min(coordinates["latitude"])) & (lat <= max(coordinates["latitude"]))]
+        lon = lon[(lon >= min(coordinates["longitude"])) & (lon <= max(coordinates["longitude"]))]
+        return {"settings": data_request.settings_key(), "latitude": coordinates["latitude"],
+                "longitude": coordinates["longitude"], "time_inter": np.asarray(result["time_inter"]).tolist(),
+                "lat_inter": np.asarray(result["lat_inter"]).tolist(),
+                "lon_inter": np.asarray(result["lon_inter"]).tolist(),
+                "grid": grid_source(data_request), "grid_latitude": lat.tolist(), "grid_longitude": lon.tolist(),
+                "variables": [key for key in result if key not in AXES]}
+
+    def add(self, key, coverage):
+        with self._lock:
+            self._entries[key] = {name: np.asarray(value) if name in AXES else value
+                                  for name, value in coverage.items()}
+
+    def refresh(self):
+        """
+        index the results stored on disk, including those computed by other processes
+        """
+        entries = {}
+        for key, header in self.cache.headers():
+            if "coverage" in header:
+                entries[key] = {name: np.asarray(value) if name in AXES else value
+                                for name, value in header["coverage"].items()}
+        with self._lock:
+            self._entries = entries
+            self._scanned = time.monotonic()
+
+    def find(self, data_request):
+        """
+        find the smallest cached result covering the request on the output grid of a direct computation
+        :return: tuple of the key of the result and the time, latitude and longitude indices to slice,
+        or None if no result covers the request
+        """
+        coordinates = data_request.get_coordinates()
+        latitude, longitude = coordinates["latitude"], coordinates["longitude"]
+        times = data_request.get_output_times()
+        settings = data_request.settings_key()
+        grid = grid_source(data_request)
+        resolution = config.settings["resolution"]
+        best = None
+        with self._lock:
+            entries = list(self._entries.items())
+        for key, entry in entries:
+            if entry["settings"] != settings or not set(data_request.variables) <= set(entry["variables"]):
+                continue
+            if entry.get("grid") != grid:
+                continue
+            if not (entry["latitude"][0] <= latitude[0] and latitude[1] <= entry["latitude"][1]
+                    and entry["longitude"][0] <= longitude[0] and longitude[1] <= entry["longitude"][1]):
+                continue
+            time_idx = np.searchsorted(entry["time_inter"], times)
+            if np.any(time_idx >= len(entry["time_inter"])) or np.any(entry["time_inter"][time_idx] != times):
+                continue
+            lat_idx = aligned(entry["lat_inter"], output_axis(entry["grid_latitude"], latitude, resolution))
+            lon_idx = aligned(entry["lon_inter"], output_axis(entry["grid_longitude"], longitude, resolution))
+            if lat_idx is None or lon_idx is None:
+                continue
+            size = len(entry["time_inter"]) * len(entry["lat_inter"]) * len(entry["lon_inter"])
+            if best is None or size < best[0]:
+                best = (size, key, time_idx, lat_idx, lon_idx)
+        return None if best is None else best[1:]
+
+    def serve(self, data_request):
+        """
+        answer a request by slicing a cached result covering it
+        :param data_request: DataRequest
+        :return: JSON encoded result or None if no cached result covers the request
+        """
+        found = self.find(data_request)
+        if found is None and (self._scanned is None or time.monotonic() - self._scanned > self.refresh_interval):
+            self.refresh()
+            found = self.find(data_request)
+        if found is None:
+            return None
+        key, time_idx, lat_idx, lon_idx = found
+        stored = self.cache.arrays(key)
+        if stored is None:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        # only the selected parts of the memory mapped arrays are read
+        arrays = stored[1]
+        sliced = {"time_inter": arrays["time_inter"][time_idx], "lat_inter": arrays["lat_inter"][lat_idx],
+                  "lon_inter": arrays["lon_inter"][lon_idx]}
+        for variable in data_request.variables:
+            sliced[variable] = arrays[variable][np.ix_(time_idx, lat_idx, lon_idx)]
+        print("Served from a cached result covering the request")
+        return b"".join(encode(sliced))
+
+
+coverage_index = CoverageIndex(result_cache, config.settings["result_cache"]["index_refresh"])
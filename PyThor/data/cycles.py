@@ -0,0 +1,11 @@
+def published_cycle(now, cycle_hours, availability_delay) -> int:
+    """
+    find the latest forecast cycle whose data is published, a cycle is published availability_delay hours
+    after it starts
+    :param now: unix timestamp
+    :param cycle_hours: hours between the starts of two forecast cycles
+    :param availability_delay: hours after the start of a cycle until its data is published
+    :return: start of the latest published forecast cycle as unix timestamp
+    """
+    cycle_seconds = int(cycle_hours * 3600)
+    return int(now - availability_delay * 3600) // cycle_seconds * cycle_seconds
@@ -1,6 +1,9 @@
 from datetime import datetime
+import hashlib
 import re
 
+import numpy as np
+
 from PyThor.app_pythor import config
 
 
@@ -73,6 +76,7 @@ class DataRequest:
         self.__time_interval = float(interval) if float(interval) > 0 else 60
         self.noaa_variables, self.currents_variables, self.tide_variables, self.wave_variables, self.wind_variables = self.__parse_variables(
             variables)
+        self.variables = [v for v in variables if v != ""]
 
     def parse_for_noaa(self) -> str:
         """
@@ -106,6 +110,16 @@ class DataRequest:
         time_end = self.__time.end
         return time_start, time_end
 
+    def get_output_times(self):
+        """
+        get the output time axis of the request
+        :return: numpy array of unix timestamps, spaced by the time interval
+        """
+        time_start, time_end = int(self.__time.start.timestamp()), int(self.__time.end.timestamp())
+        if time_start != time_end:
+            return np.arange(time_start, time_end, int(self.__time_interval * 60))
+        return np.array([time_start])
+
     def get_coordinates(self) -> dict[str, list]:
         """
         get coordinates from the API request in lat lon units
@@ -200,6 +214,32 @@ class DataRequest:
             return False
         return True
 
+    @staticmethod
+    def settings_key() -> str:
+        """
+        hash of the settings the result of a request depends on
+        :return: hex digest
+        """
+        canonical = [config.settings["resolution"], config.settings["land_treshhold"], config.settings["noaa_active"],
+                     config.settings["data_source"]["backend"], config.settings["interpolation"]["engine"]]
+        if config.settings["data_source"]["backend"] != "remote":
+            canonical.append(config.settings["data_source"]["synthetic"]["seed"])
+        if config.settings["interpolation"]["engine"] == "local_rbf":
+            canonical.append(config.settings["interpolation"]["neighbours"])
+        return hashlib.sha256(repr(canonical).encode()).hexdigest()
+
+    def cache_key(self) -> str:
+        """
+        hash of the canonical form of the request and of the settings its result depends on
+        :return: hex digest
+        """
+        time_start, time_end = self.get_time()
+        canonical = [int(time_start.timestamp()), int(time_end.timestamp()), self.__time_interval,
+                     self.__latitude.start, self.__latitude.end, self.__longitude.start, self.__longitude.end,
+                     self.noaa_variables, self.currents_variables, self.tide_variables, self.wind_variables,
+                     self.settings_key()]
+        return hashlib.sha256(repr(canonical).encode()).hexdigest()
+
     def __str__(self):
         result = ""
         for s in self.get_time():
@@ -216,4 +256,10 @@ class DataRequest:
             result += str(s)
         result += str(config.settings["resolution"])
         result += str(config.settings["land_treshhold"])
+        if config.settings["data_source"]["backend"] != "remote":
+            result += str(config.settings["data_source"]["backend"]) + str(
+                config.settings["data_source"]["synthetic"]["seed"])
+        result += str(config.settings["interpolation"]["engine"])
+        if config.settings["interpolation"]["engine"] == "local_rbf":
+            result += str(config.settings["interpolation"]["neighbours"])
         return re.sub(r'[^a-zA-Z0-9\s]', '', result.strip())
@@ -1,15 +1,19 @@
-import asyncio
-from urllib.request import urlretrieve
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FetchTimeoutError
 
 import atexit
+import numpy as np
 import xarray as xr
-import copernicusmarine
 import pytz
 from datetime import datetime, timedelta
 
 import PyThor.data.data_request as dr
 from PyThor.app_pythor import config
-from PyThor.config.config import save_folder
+from PyThor.data.interpolation import bracketing_steps
+from PyThor.data.raw_cache import raw_cache
+from PyThor.data.sources import data_source
+from PyThor.data.source_data import SourceData
 from PyThor.utilities.files import rm_grib_files, rm_cache_files
 
 # Register cleanup functions
@@ -17,6 +21,27 @@ atexit.register(rm_grib_files)
 if config.settings["clear_cache"]:
     atexit.register(rm_cache_files)
 
+# shared by all Fetcher instances, so the sources of one request are downloaded concurrently
+fetch_executor = ThreadPoolExecutor(max_workers=config.settings["fetching"]["max_workers"],
+                                    thread_name_prefix="pythor-fetch")
+# hourly NOAA files are downloaded on a separate pool, so they never wait for the source fetches above
+noaa_executor = ThreadPoolExecutor(max_workers=config.settings["fetching"]["noaa_workers"],
+                                   thread_name_prefix="pythor-noaa")
+# seconds between checks whether a source waiting for a free fetch thread has started
+START_POLL = 0.05
+# the cancellation event of the source fetched by the current thread
+_current = threading.local()
+
+
+def check_cancelled():
+    """
+    stop the source fetched by the current thread once fetch gave up waiting for it,
+    called between downloads since a download in progress can not be interrupted
+    """
+    cancelled = getattr(_current, "cancelled", None)
+    if cancelled is not None and cancelled.is_set():
+        raise FetchTimeoutError("cancelled after timing out")
+
 
 class Fetcher:
     """
@@ -31,8 +56,6 @@ class Fetcher:
             self.__request = request
         else:
             raise print("argument is not valid data request")
-        self.USERNAME = config.settings["coppernicus_acount"]["username"]
-        self.PASSWORD = config.settings["coppernicus_acount"]["password"]
 
     @staticmethod
     def map_hour(hour):
@@ -77,27 +100,140 @@ class Fetcher:
                     map_date = map_date + timedelta(days=1)
                 return map_date
 
-    def run_currents_task(self, data_request):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.fetch_currents_async(data_request))
-        loop.close()
+    def open_copernicus(self, data_request, time_start, time_end):
+        """
+        lazily open a copernicus dataset covering the requested area with a small interpolation halo,
+        then select only the time steps bracketing the output times, so nothing else is ever loaded
+        with the raw data cache active, only the tiles and time chunks missing from the cache are downloaded
+        :param data_request: dict returned by one of the DataRequest.parse_for_copernicus_* methods
+        :return: lazy xarray dataset
+        """
+        halo = config.settings["fetching"]["halo"]
+        latitude = [max(-90.0, data_request["latitude"][0] - halo), min(90.0, data_request["latitude"][1] + halo)]
+        longitude = [max(-180.0, data_request["longitude"][0] - halo),
+                     min(180.0, data_request["longitude"][1] + halo)]
+        if raw_cache is None:
+            dataset = self.open_area(data_request["dataset_id"], data_request["variables"], latitude, longitude,
+                                     time_start, time_end)
+        else:
+            dataset = self.open_cached(data_request, latitude, longitude, time_start, time_end)
+        return self.select_steps(dataset)
+
+    def open_area(self, dataset_id, variables, latitude, longitude, time_start, time_end):
+        """
+        lazily select the surface level of a copernicus dataset over an area and a time range
+        the dataset comes from the configured data source, which opens it once for all requests
+        :param latitude: [start, end] of the area
+        :param longitude: [start, end] of the area
+        :param time_start: naive UTC datetime
+        :param time_end: naive UTC datetime
+        :return: lazy xarray dataset
+        """
+        dataset = data_source.dataset(dataset_id)
+        names = data_source.metadata(dataset_id)["variables"]
+        dataset = dataset[[self.variable_name(names, v) for v in variables]]
+        if "depth" in dataset.dims:
+            dataset = dataset.isel(depth=slice(0, 1))
+        return dataset.sel(latitude=slice(*latitude), longitude=slice(*longitude),
+                           time=slice(np.datetime64(time_start), np.datetime64(time_end)))
+
+    def open_cached(self, data_request, latitude, longitude, time_start, time_end):
+        """
+        assemble a copernicus dataset from the raw data cache, downloading only the missing tiles and time steps
+        only the source time steps bracketing the output times are cached and downloaded, the missing ones
+        are downloaded once per time chunk over the bounding box of the tiles lacking them
+        :param latitude: [start, end] of the area
+        :param longitude: [start, end] of the area
+        :param time_start: naive UTC datetime
+        :param time_end: naive UTC datetime
+        :return: xarray dataset
+        """
+        dataset_id = data_request["dataset_id"]
+        cache_id = data_source.cache_id(dataset_id)
+        metadata = data_source.metadata(dataset_id)
+        source_time = metadata["time"].astype('datetime64[s]').astype('int64')
+        start = int(time_start.replace(tzinfo=pytz.utc).timestamp())
+        end = int(time_end.replace(tzinfo=pytz.utc).timestamp())
+        steps = source_time[(source_time >= start) & (source_time <= end)]
+        steps = steps[bracketing_steps(steps, self.__request.get_output_times())]
+        if len(steps) == 0:
+            # nothing to cache, the empty selection is interpolated as missing data
+            return self.open_area(dataset_id, data_request["variables"], latitude, longitude, time_start, time_end)
+        pieces = []
+        missing = 0
+        for chunk in np.unique(steps // raw_cache.chunk_seconds):
+            check_cancelled()
+            needed = steps[steps // raw_cache.chunk_seconds == chunk]
+            needed_times = needed.astype('datetime64[s]').astype('datetime64[ns]')
+            cached, lacking = {}, {}
+            for tile in raw_cache.tiles(latitude, longitude):
+                for variable in data_request["variables"]:
+                    piece = raw_cache.load(cache_id, variable, tile, chunk)
+                    have = np.array([]) if piece is None else piece["time"].values.astype('datetime64[s]').astype(
+                        'int64')
+                    cached[(tile, variable)] = piece
+                    if not np.isin(needed, have).all():
+                        lacking[(tile, variable)] = np.setdiff1d(needed, have)
+            if lacking:
+                missing += len({tile for tile, _ in lacking})
+                tiles = [raw_cache.tile_bounds(tile) for tile, _ in lacking]
+                variables = sorted({variable for _, variable in lacking})
+                times = np.unique(np.concatenate(list(lacking.values())))
+                fetched = self.open_area(dataset_id, variables,
+                                         [max(-90.0, min(t[0] for t in tiles)), min(90.0, max(t[1] for t in tiles))],
+                                         [max(-180.0, min(t[2] for t in tiles)), min(180.0, max(t[3] for t in tiles))],
+                                         datetime.fromtimestamp(int(times[0]), pytz.utc).replace(tzinfo=None),
+                                         datetime.fromtimestamp(int(times[-1]), pytz.utc).replace(tzinfo=None))
+                fetched_time = fetched["time"].values.astype('datetime64[s]').astype('int64')
+                fetched = fetched.isel(time=np.flatnonzero(np.isin(fetched_time, times))).load()
+                for (tile, variable), lacking_steps in lacking.items():
+                    piece = raw_cache.split(fetched, tile, chunk)[[self.variable_name(metadata["variables"],
+                                                                                      variable)]]
+                    piece_time = piece["time"].values.astype('datetime64[s]').astype('int64')
+                    piece = piece.isel(time=np.flatnonzero(np.isin(piece_time, lacking_steps)))
+                    if cached[(tile, variable)] is not None:
+                        piece = xr.concat([cached[(tile, variable)], piece], dim="time").sortby("time")
+                    raw_cache.save(cache_id, variable, tile, chunk, piece)
+                    cached[(tile, variable)] = piece
+            for piece in cached.values():
+                pieces.append(piece.sel(time=needed_times))
+        if missing:
+            print(f"Downloaded {missing} missing tiles of {dataset_id}")
+        pieces = [p for p in pieces if all(size > 0 for size in p.sizes.values())]
+        if not pieces:
+            raise ValueError(f"no {dataset_id} data available for the requested area and time range")
+        dataset = xr.combine_by_coords(pieces, combine_attrs="drop")
+        return dataset.sel(latitude=slice(*latitude), longitude=slice(*longitude))
 
-    async def fetch_currents_async(self, data_request):
+    @staticmethod
+    def variable_name(names, variable):
+        """
+        find a requested variable, copernicus requests use standard names but datasets use short variable names
+        :param names: dict of the standard name of every variable by variable name
+        :param variable: variable name or standard name
+        :return: variable name
+        """
+        for name, standard_name in names.items():
+            if variable in (name, standard_name):
+                return name
+        raise KeyError(f"{variable} not found in the dataset")
+
+    def select_steps(self, dataset):
+        """
+        select the time steps of a lazy dataset bracketing the output times of the request
+        :param dataset: xarray dataset
+        :return: lazy xarray dataset
+        """
+        time = dataset["time"].values.astype('datetime64[s]').astype('int64')
+        return dataset.isel(time=bracketing_steps(time, self.__request.get_output_times()))
+
+    def open_currents(self, data_request):
         time_start, time_end = data_request["time"][0].astimezone(pytz.timezone('UTC')).replace(tzinfo=None), \
             data_request["time"][1].astimezone(
                 pytz.timezone('UTC')).replace(tzinfo=None)
-        time_start = time_start.replace(hour=self.curr_map_hour(data_request["time"][0].hour))
-        time_end = self.curr_map_later_date(time_end)
-        self.currents = copernicusmarine.open_dataset(
-            dataset_id=data_request["dataset_id"],
-            minimum_longitude=data_request["longitude"][0],
-            maximum_longitude=data_request["longitude"][1],
-            minimum_latitude=data_request["latitude"][0],
-            maximum_latitude=data_request["latitude"][1],
-            start_datetime=time_start,
-            end_datetime=time_end,
-            variables=data_request["variables"], username=self.USERNAME, password=self.PASSWORD)
+        time_start = time_start.replace(hour=self.curr_map_hour(time_start.hour), minute=0, second=0, microsecond=0)
+        time_end = self.curr_map_later_date(time_end).replace(minute=0, second=0, microsecond=0)
+        self.currents = self.open_copernicus(data_request, time_start, time_end)
 
     def fetch_currents(self):
         """
@@ -105,30 +241,16 @@ class Fetcher:
         :return: xarray dataset
         """
         data_request = self.__request.parse_for_copernicus_currents()
-        self.run_currents_task(data_request)
+        self.open_currents(data_request)
         return self.currents
 
-    def run_wind_task(self, data_request):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.fetch_wind_async(data_request))
-        loop.close()
-
-    async def fetch_wind_async(self, data_request):
+    def open_wind(self, data_request):
         time_start, time_end = data_request["time"][0].astimezone(pytz.timezone('UTC')).replace(tzinfo=None), \
             data_request["time"][1].astimezone(
                 pytz.timezone('UTC')).replace(tzinfo=None)
-        time_start = time_start.replace(hour=self.curr_map_hour(data_request["time"][0].hour))
-        time_end = self.curr_map_later_date(time_end)
-        self.wind = copernicusmarine.open_dataset(
-            dataset_id=data_request["dataset_id"],
-            minimum_longitude=data_request["longitude"][0],
-            maximum_longitude=data_request["longitude"][1],
-            minimum_latitude=data_request["latitude"][0],
-            maximum_latitude=data_request["latitude"][1],
-            start_datetime=time_start,
-            end_datetime=time_end,
-            variables=data_request["variables"], username=self.USERNAME, password=self.PASSWORD)
+        time_start = time_start.replace(hour=self.curr_map_hour(time_start.hour), minute=0, second=0, microsecond=0)
+        time_end = self.curr_map_later_date(time_end).replace(minute=0, second=0, microsecond=0)
+        self.wind = self.open_copernicus(data_request, time_start, time_end)
 
     def fetch_wind_copernicus(self):
         """
@@ -136,29 +258,19 @@ class Fetcher:
         :return: xarray dataset
         """
         data_request = self.__request.parse_for_copernicus_wind()
-        self.run_wind_task(data_request)
+        self.open_wind(data_request)
         return self.wind
 
-    def run_tide_task(self, data_request):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.fetch_tide_async(data_request))
-        loop.close()
-
-    async def fetch_tide_async(self, data_request):
+    def open_tide(self, data_request):
         time_start = data_request["time"][0]
         time_end = data_request["time"][1]
         time_start, time_end = time_start.astimezone(pytz.timezone('UTC')).replace(tzinfo=None), time_end.astimezone(
             pytz.timezone('UTC')).replace(tzinfo=None)
-        self.tide = copernicusmarine.open_dataset(
-            dataset_id=data_request["dataset_id"],
-            minimum_longitude=data_request["longitude"][0],
-            maximum_longitude=data_request["longitude"][1],
-            minimum_latitude=data_request["latitude"][0],
-            maximum_latitude=data_request["latitude"][1],
-            start_datetime=time_start,
-            end_datetime=time_end,
-            variables=data_request["variables"], username=self.USERNAME, password=self.PASSWORD)
+        # tides are hourly samples at half past the hour, widen the window by one step on each side
+        # so the requested times are bracketed
+        time_start = time_start - timedelta(hours=1)
+        time_end = time_end + timedelta(hours=1)
+        self.tide = self.open_copernicus(data_request, time_start, time_end)
 
     def fetch_tide(self):
         """
@@ -166,103 +278,194 @@ class Fetcher:
         :return: xarray dataset
         """
         data_request = self.__request.parse_for_copernicus_tide()
-        self.run_tide_task(data_request)
+        self.open_tide(data_request)
         return self.tide
 
-    def fetch_wave_and_wind(self):
+    def noaa_downloads(self) -> list[dict]:
         """
-        Fetch wave and wind data from NOAA and process it for further use.
-
-        :return: Processed wave and wind data.
+        plan the NOAA downloads covering the requested time range, one GRIB file per hour
+        past hours come from the forecast cycle they belong to, future hours from the latest cycle
+        only the hours bracketing the output times of the request are planned
+        :return: list of dicts with the hour (datetime), url, file name, lead time (hours), valid time (unix timestamp),
+        requested area and NOAA variables of every download
         """
         now = datetime.now().astimezone(pytz.timezone('UTC'))
-        res = {}
         time_start, time_end = self.__request.get_time()
         time_start, time_end = time_start.astimezone(pytz.timezone('UTC')), time_end.astimezone(
             pytz.timezone('UTC'))
-        forecast_time = time_start
-        i = 0
-        j = 0
-        time_data = []
-        forecast_hour = None
-        while forecast_time <= time_end:
-            if forecast_time <= now:
-
-                forecast_hour = self.map_hour(forecast_time.hour)
-                j = forecast_time.hour % 6
-                h = '{:03d}'.format(j)
-                url = (
-                        "https://nomads.ncep.noaa.gov/cgi-bin/filter_gfswave.pl?dir=%2Fgfs." +
-                        forecast_time.strftime("%Y%m%d") + "%2F" + forecast_hour + "%2Fwave%2Fgridded&file="
-                                                                                   "gfswave.t" + forecast_hour +
-                        "z.global.0p25.f" + h + ".grib2" + self.__request.parse_for_noaa()
-                )
-            else:
-                h = '{:03d}'.format(j)
-                forecast_hour = self.map_hour(now.hour)
-
-                url = (
-                        "https://nomads.ncep.noaa.gov/cgi-bin/filter_gfswave.pl?dir=%2Fgfs." +
-                        now.strftime("%Y%m%d") + "%2F" + forecast_hour + "%2Fwave%2Fgridded&file="
-                                                                         "gfswave.t" + forecast_hour +
-                        "z.global.0p25.f" + h + ".grib2" + self.__request.parse_for_noaa()
-                )
+        downloads = []
+        # files are hourly, plan from the hour at or before the start to the hour after the end
+        forecast_time = time_start.replace(minute=0, second=0, microsecond=0)
+        while forecast_time <= time_end + timedelta(hours=1):
+            cycle_date = forecast_time if forecast_time <= now else now
+            forecast_hour = self.map_hour(cycle_date.hour)
+            cycle = cycle_date.replace(hour=int(forecast_hour), minute=0, second=0, microsecond=0)
+            j = int((forecast_time - cycle).total_seconds() // 3600)
+            h = '{:03d}'.format(j)
+            url = (
+                    "https://nomads.ncep.noaa.gov/cgi-bin/filter_gfswave.pl?dir=%2Fgfs." +
+                    cycle.strftime("%Y%m%d") + "%2F" + forecast_hour + "%2Fwave%2Fgridded&file="
+                                                                       "gfswave.t" + forecast_hour +
+                    "z.global.0p25.f" + h + ".grib2" + self.__request.parse_for_noaa()
+            )
             filename = "ww" + forecast_time.strftime("%Y%m%d") + forecast_hour + str(j) + ".grib2"
+            downloads.append({"hour": forecast_time, "url": url, "filename": filename, "lead": j,
+                              "valid": int(cycle.timestamp()) + 3600 * j, "area": self.__request.get_coordinates(),
+                              "variables": self.__request.noaa_variables})
+            forecast_time = forecast_time + timedelta(hours=1)
+        # only the hours bracketing the output times are needed
+        steps = bracketing_steps(np.array([d["valid"] for d in downloads]), self.__request.get_output_times())
+        return [downloads[i] for i in steps]
 
-            try:
-                print(save_folder / filename)
-                urlretrieve(url, save_folder / filename)
-                wave_unproccessed = xr.load_dataset(save_folder / filename, engine='cfgrib')
-                res["longitude"] = wave_unproccessed["longitude"].values.tolist()
-                res["latitude"] = wave_unproccessed["latitude"].values.tolist()
-                t = wave_unproccessed["time"].values
-                t = int(t.astype('datetime64[s]').astype('int64'))
-                t = t + 3600 * j
-                time_data.append(t)
-                j = j + 1
-
-                for v in wave_unproccessed:
-                    if v in res:
-                        res[v].append(wave_unproccessed[v].values.tolist())
-                    else:
-                        res[v] = []
-                        res[v].append(wave_unproccessed[v].values.tolist())
-            except Exception as e:
-                print(str(e))
+    def fetch_wave_and_wind(self):
+        """
+        Fetch wave and wind data from NOAA and process it for further use.
+        The hourly files are downloaded concurrently and decoded in memory into one (time, lat, lon) array
+        per variable, hours that could not be downloaded or decoded are listed under "missing" as unix timestamps,
+        a failing hour never prevents the others from being used.
 
-            i = i + 1
-            forecast_time = forecast_time + timedelta(hours=1)
-        res["time"] = []
-        for e in time_data:
-            res["time"].append(e)
+        :return: Processed wave and wind data.
+        """
+        res = {}
+        downloads = self.noaa_downloads()
+        time_data = np.zeros(len(downloads), dtype="int64")
+        decoded = np.zeros(len(downloads), dtype=bool)
+        missing = []
+        futures = [noaa_executor.submit(data_source.noaa_download, download) for download in downloads]
+        try:
+            for i, (download, future) in enumerate(zip(downloads, futures)):
+                check_cancelled()
+                try:
+                    content = future.result()
+                except Exception as e:
+                    print(f"Downloading {download['filename']} failed: {e}")
+                    content = None
+                try:
+                    if content is None:
+                        raise ValueError("not downloaded")
+                    grib = data_source.noaa_decode(content)
+                    if "latitude" not in res:
+                        res["latitude"] = grib["latitude"]
+                        res["longitude"] = grib["longitude"]
+                    for v, values in grib["fields"].items():
+                        if v not in res:
+                            res[v] = np.full((len(downloads),) + values.shape, np.nan)
+                        res[v][i] = values
+                    time_data[i] = grib["time"] + 3600 * download["lead"]
+                    decoded[i] = True
+                except Exception as e:
+                    if content is not None:
+                        print(f"Decoding {download['filename']} failed: {e}")
+                    missing.append(int(download["hour"].timestamp()))
+        finally:
+            # hours not downloaded yet are dropped when the source was cancelled
+            for future in futures:
+                future.cancel()
+        if missing:
+            print(f"NOAA data missing for {len(missing)} of {len(downloads)} hours")
+        if not decoded.any():
+            raise RuntimeError("no NOAA data available for the requested time range")
+        # NOAA grids are stored north to south, interpolation expects ascending coordinates
+        flip = len(res["latitude"]) > 1 and res["latitude"][0] > res["latitude"][-1]
+        if flip:
+            res["latitude"] = res["latitude"][::-1]
+        for v in res:
+            if v not in ("latitude", "longitude"):
+                res[v] = res[v][decoded][:, ::-1] if flip else res[v][decoded]
+        res["time"] = time_data[decoded]
+        res["missing"] = missing
 
         return res
 
+    @staticmethod
+    def source_data(data_request, fetch) -> SourceData:
+        """
+        load the dataset returned by fetch into memory
+        :param data_request: dict returned by one of the DataRequest.parse_for_copernicus_* methods
+        :param fetch: one of the fetch_* methods
+        """
+        dataset = fetch()
+        check_cancelled()
+        return SourceData(data_source.cache_id(data_request["dataset_id"]), dataset.load())
+
+    @staticmethod
+    def __run(task, started, name, cancelled):
+        """
+        run the task of a source on a fetch thread, recording when it started
+        """
+        started[name] = time.monotonic()
+        _current.cancelled = cancelled
+        try:
+            return task()
+        finally:
+            _current.cancelled = None
+
+    @staticmethod
+    def __result(future, started, name, submitted):
+        """
+        wait for the result of a source at most the configured timeout from the moment it started running,
+        a source still waiting for a free fetch thread after the timeout is given up as well
+        :raise FetchTimeoutError: when the source timed out
+        """
+        timeout = config.settings["fetching"]["timeout"]
+        while True:
+            start = started.get(name)
+            if start is None and time.monotonic() - submitted > timeout:
+                raise FetchTimeoutError()
+            wait = START_POLL if start is None else max(0.0, start + timeout - time.monotonic())
+            try:
+                return future.result(timeout=wait)
+            except FetchTimeoutError:
+                if start is not None:
+                    raise
+
     def fetch(self) -> dict[str, dict]:
         """
         fetch relevant data based on the DataRequest provided in the constructor
+        all sources are fetched concurrently, each one within the configured timeout counted from when it starts,
+        a failing source does not prevent the others from being returned
+        a source that timed out stops before its next download, the download in progress is bounded by the
+        HTTP timeouts and keeps its thread busy until it returns, then its result is discarded
         :return: a dict structured like:
             - waves_and_wind : dict with waves and wind data from noaa
-            - tides : dict with tides data from copernicus
-            - currents : dict with currents data from copernicus
+            - copernicus : dict with SourceData of the tides, currents and wind datasets from copernicus
+            - errors : dict with the error message of every source that could not be fetched
         """
-        waves_and_wind, tides, currents = None, None, None
-        res = {}
+        res = {"waves_and_wind": None, "copernicus": {}, "errors": {}}
         print("Fetching data...")
+        tasks = {}
         if config.settings["noaa_active"] is True:
             if len(self.__request.noaa_variables) > 0:
-                waves_and_wind = self.fetch_wave_and_wind()
-        res["waves_and_wind"] = waves_and_wind
-        res["copernicus"] = {}
+                tasks["waves_and_wind"] = self.fetch_wave_and_wind
         if len(self.__request.tide_variables) > 0:
-            tides = self.fetch_tide().to_dict()
-            res["copernicus"]["tides"] = tides
+            tasks["tides"] = lambda: self.source_data(self.__request.parse_for_copernicus_tide(), self.fetch_tide)
         if self.__request.currents_variables != [[], []]:
-            currents = self.fetch_currents().to_dict()
-            res["copernicus"]["currents"] = currents
+            tasks["currents"] = lambda: self.source_data(self.__request.parse_for_copernicus_currents(),
+                                                         self.fetch_currents)
         if self.__request.wind_variables != [[], []]:
-            wind = self.fetch_wind_copernicus()
-            wind_d = wind.to_dict()
-            res["copernicus"]["wind"] = wind_d
+            tasks["wind"] = lambda: self.source_data(self.__request.parse_for_copernicus_wind(),
+                                                     self.fetch_wind_copernicus)
+
+        started, cancelled = {}, {name: threading.Event() for name in tasks}
+        submitted = time.monotonic()
+        futures = {name: fetch_executor.submit(self.__run, task, started, name, cancelled[name])
+                   for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                data = self.__result(future, started, name, submitted)
+            except FetchTimeoutError:
+                cancelled[name].set()
+                future.cancel()
+                print(f"Fetching {name} timed out")
+                res["errors"][name] = "timeout"
+                continue
+            except Exception as e:
+                print(f"Fetching {name} failed: {e}")
+                res["errors"][name] = str(e)
+                continue
+            if name == "waves_and_wind":
+                res[name] = data
+            else:
+                res["copernicus"][name] = data
         print("Fetching finished")
         return res
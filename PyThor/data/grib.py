@@ -0,0 +1,78 @@
+import os
+import struct
+import tempfile
+
+import numpy as np
+import xarray as xr
+
+from PyThor.config.config import save_folder
+
+try:
+    import eccodes
+except ImportError:  # decoding falls back to cfgrib through a temporary file
+    eccodes = None
+
+
+def split_messages(data: bytes) -> list[bytes]:
+    """
+    split the content of a GRIB file into single messages
+    :param data: GRIB file content
+    :return: list of GRIB messages
+    """
+    messages = []
+    start = data.find(b"GRIB")
+    while start != -1 and start + 16 <= len(data):
+        edition = data[start + 7]
+        if edition == 2:
+            length = struct.unpack(">Q", data[start + 8:start + 16])[0]
+        else:
+            length = int.from_bytes(data[start + 4:start + 7], "big")
+        messages.append(data[start:start + length])
+        start = data.find(b"GRIB", start + length)
+    return messages
+
+
+def decode_grib(data: bytes) -> dict:
+    """
+    decode a GRIB file held in memory
+    :param data: GRIB file content
+    :return: a dict structured like:
+        - latitude, longitude : coordinates of the grid in file order
+        - time : reference time of the forecast as unix timestamp
+        - fields : dict of 2D arrays (latitude, longitude) by GRIB short name, NaN where data is missing
+    """
+    if eccodes is None:
+        return _decode_with_cfgrib(data)
+    res = {"fields": {}}
+    for message in split_messages(data):
+        handle = eccodes.codes_new_from_message(message)
+        try:
+            ni, nj = eccodes.codes_get(handle, "Ni"), eccodes.codes_get(handle, "Nj")
+            if "latitude" not in res:
+                res["latitude"] = np.linspace(eccodes.codes_get(handle, "latitudeOfFirstGridPointInDegrees"),
+                                              eccodes.codes_get(handle, "latitudeOfLastGridPointInDegrees"), nj)
+                res["longitude"] = np.linspace(eccodes.codes_get(handle, "longitudeOfFirstGridPointInDegrees"),
+                                               eccodes.codes_get(handle, "longitudeOfLastGridPointInDegrees"), ni)
+                date, time = str(eccodes.codes_get(handle, "dataDate")), eccodes.codes_get(handle, "dataTime")
+                res["time"] = int(np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:]}T{time // 100:02d}:{time % 100:02d}")
+                                  .astype("datetime64[s]").astype("int64"))
+            missing = eccodes.codes_get_double(handle, "missingValue")
+            values = eccodes.codes_get_values(handle).reshape(nj, ni)
+            res["fields"][eccodes.codes_get(handle, "shortName")] = np.where(values == missing, np.nan, values)
+        finally:
+            eccodes.codes_release(handle)
+    return res
+
+
+def _decode_with_cfgrib(data: bytes) -> dict:
+    fd, path = tempfile.mkstemp(dir=save_folder, suffix=".grib2")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        dataset = xr.load_dataset(path, engine="cfgrib", backend_kwargs={"indexpath": ""})
+    finally:
+        os.remove(path)
+    t = dataset["time"].values
+    return {"latitude": dataset["latitude"].values, "longitude": dataset["longitude"].values,
+            "time": int(t.astype("datetime64[s]").astype("int64")),
+            "fields": {v: dataset[v].values for v in dataset.data_vars}}
@@ -1,25 +1,13 @@
-from copy import deepcopy
-
 import numpy as np
-from scipy.interpolate import Rbf, RegularGridInterpolator
 import PyThor.data.data_request as dr
 from PyThor.app_pythor import config
+from PyThor.data.parallel import run_chunks
+from PyThor.data.spatial import plan_work, interpolate_work, interpolate_piece
+from PyThor.data.weights import weights_store
+from PyThor.data.land_mask import land_masks
+from PyThor.data.sources import data_source
 
-
-def spherical_to_cartesian(lat, lon, r=1):
-    """
-    return cartesian coordinates of given spherical coordinates
-    :param r:
-    :param lon: longitude of given point
-    :param lat: latitude of given point
-    :return: a tuple of three coordinates in cartesian system
-    """
-    lat_rad = np.deg2rad(lat)
-    lon_rad = np.deg2rad(lon)
-    x = r * np.cos(lat_rad) * np.cos(lon_rad)
-    y = r * np.cos(lat_rad) * np.sin(lon_rad)
-    z = r * np.sin(lat_rad)
-    return x, y, z
+NOAA_DATASET_ID = "gfswave.global.0p25"
 
 
 def get_data(wave_wind_not_inter):
@@ -35,14 +23,46 @@ def get_data(wave_wind_not_inter):
 
 
 def get_copernicus_data(data):
-    lat = np.array(data["coords"]["latitude"]["data"])
-    lon = np.array(data["coords"]["longitude"]["data"])
-    time = np.array(data["coords"]["time"]["data"])
-    time = time.astype('datetime64[s]').astype('int64')
-    return lat, lon, time
+    """
+    extract longitude, latitude and time data from fetched copernicus data
+    :param data: SourceData of a copernicus dataset
+    :return: a tuple of three dimensions
+    """
+    return data.latitude, data.longitude, data.time
+
 
+def bracketing_steps(time, time_inter):
+    """
+    find the source time steps needed to linearly interpolate onto the requested times,
+    for every requested time these are the two steps of the interval the time interpolation uses
+    :param time: ascending source time axis
+    :param time_inter: requested times
+    :return: sorted array of indices of the needed source time steps
+    """
+    if len(time) < 2:
+        return np.arange(len(time))
+    lower = np.clip(np.searchsorted(time, np.atleast_1d(time_inter)) - 1, 0, len(time) - 2)
+    return np.union1d(lower, lower + 1)
 
-def check_keys(keys_to_check, wave_wind_not_inter, keys, weather, result, lon_inter, lat_inter, time_inter):
+
+def output_axis(axis, bounds, resolution):
+    """
+    build an output axis spanning the source points inside the requested bounds,
+    the halo fetched around the requested area only feeds the interpolation
+    areas holding a single source point or none get a single output point, at the source point
+    or at the centre of the area
+    :param axis: source coordinate axis
+    :param bounds: [start, end] of the requested area
+    :return: output coordinate axis, never empty
+    """
+    inside = axis[(axis >= min(bounds)) & (axis <= max(bounds))]
+    if len(inside) == 0:
+        return np.array([(bounds[0] + bounds[-1]) / 2])
+    res = np.arange(inside[0], inside[-1], resolution)
+    return res if len(res) else inside[:1]
+
+
+def check_keys(keys_to_check, wave_wind_not_inter, keys, weather):
     wave_and_wind_dict = {
         "dirpw": "wave_direction",
         "swh": "wave_height",
@@ -54,82 +74,102 @@ def check_keys(keys_to_check, wave_wind_not_inter, keys, weather, result, lon_in
     for key in keys_to_check:
         if key in wave_wind_not_inter:
             if key == "dirpw":
-                components = [wave_and_wind_dict[key] + "_x", wave_and_wind_dict[key] + "_y"]
-                og_key = key
-                for c in components:
-                    key = c
-                    keys.append(key)
-                    key_inter = key + "_inter"
-                    if key[-1] == "x":
-                        weather[key] = np.cos(np.deg2rad(np.array(wave_wind_not_inter[og_key])))
-                    else:
-                        weather[key] = np.sin(np.deg2rad(np.array(wave_wind_not_inter[og_key])))
-
-                    weather[key + "_mask"] = np.isnan(weather[key]).astype(float)
-                    keys.append(key + "_mask")
-                    result[key_inter] = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in
-                                         range(len(time_inter))]
-                    result[key + "_mask" + "_inter"] = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in
-                                                        range(len(time_inter))]
+                direction = np.deg2rad(np.asarray(wave_wind_not_inter[key], dtype=float))
+                components = {wave_and_wind_dict[key] + "_x": np.cos, wave_and_wind_dict[key] + "_y": np.sin}
+                for c, component in components.items():
+                    weather[c] = component(direction)
+                    keys.append(c)
             else:
-                keys.append(wave_and_wind_dict[key])
-                key_inter = wave_and_wind_dict[key] + "_inter"
-                weather[wave_and_wind_dict[key]] = np.array(wave_wind_not_inter[key])
-                weather[wave_and_wind_dict[key] + "_mask"] = np.isnan(weather[wave_and_wind_dict[key]]).astype(float)
-                keys.append(wave_and_wind_dict[key] + "_mask")
-                result[key_inter] = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in
-                                     range(len(time_inter))]
-                result[wave_and_wind_dict[key] + "_mask" + "_inter"] = [
-                    [[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in
-                    range(len(time_inter))]
-
-
-def latlon_interpolation(time, weather, key, lat_grid, lon_grid, lat_inter_grid, lon_inter_grid, res):
-    for k in range(len(time)):
-        elem = weather[key]
-        nan_mask = np.isnan(elem[k])
-        indices = np.where(~nan_mask)
-        data_points_valid = elem[k][indices]
-        lat_valid = lat_grid[~nan_mask]
-        lon_valid = lon_grid[~nan_mask]
-        x, y, z = spherical_to_cartesian(lat_valid.ravel(), lon_valid.ravel())
-        interp_spatial = Rbf(x, y, z, data_points_valid, function='thin_plate', smooth=0)
-
-        x_inter, y_inter, z_inter = spherical_to_cartesian(lat_inter_grid, lon_inter_grid)
-        res[k] = interp_spatial(x_inter, y_inter, z_inter)
+                name = wave_and_wind_dict[key]
+                weather[name] = np.asarray(wave_wind_not_inter[key], dtype=float)
+                keys.append(name)
+
+
+def latlon_interpolation(time, weather, keys, lat, lon, lat_inter, lon_inter):
+    """
+    spatially interpolate every time step of the given variables,
+    slices sharing a NaN pattern (land cells) are solved together as one multi right hand side operation
+    large areas are split into tiles fitting in the configured memory budget
+    with more than one worker the pieces of work are split between worker processes, the pieces are planned
+    once here, so the result is the same as interpolating them one after another
+    :return: a dict with an array of shape (time, lat_inter, lon_inter) for every key
+    """
+    settings = config.settings["interpolation"]
+    max_workers = settings["max_workers"]
+    slices = np.concatenate([np.asarray(weather[key], dtype=float)[:len(time)] for key in keys])
+    work = plan_work(settings["engine"], slices, lat, lon, lat_inter, lon_inter, settings["neighbours"],
+                     settings["memory_budget_mb"] * 1024 * 1024, settings["tile_halo"])
+    if max_workers > 1 and len(work) > 1:
+        chunks = [(np.ix_(members, rows, cols), np.ix_(members, lat_tile, lon_tile),
+                   (lat[rows], lon[cols], lat_inter[lat_tile], lon_inter[lon_tile]))
+                  for members, rows, cols, lat_tile, lon_tile in work]
+        res = run_chunks(_spatial_chunk, slices, (len(slices), len(lat_inter), len(lon_inter)), chunks, max_workers,
+                         settings["engine"], settings["neighbours"], weights_store)
+    else:
+        res = interpolate_work(settings["engine"], slices, lat, lon, lat_inter, lon_inter, work,
+                               settings["neighbours"], weights_store)
+    return dict(zip(keys, np.split(res, len(keys))))
+
+
+def _spatial_chunk(slices, lat, lon, lat_inter, lon_inter, engine, neighbours, store):
+    return interpolate_piece(engine, slices, lat, lon, lat_inter, lon_inter, neighbours, store)
 
 
 def time_interpolation(time, lat_inter, lon_inter, res, key, time_inter, weather):
-    interpolator = RegularGridInterpolator((time, lat_inter, lon_inter), res)
-    key_inter = key + "_inter"
-    result = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in range(len(time_inter))]
-    for k in range(len(time_inter)):
-        for i in range(len(lat_inter)):
-            for j in range(len(lon_inter)):
-                try:
-                    result[k][i][j] = interpolator([time_inter[k], lat_inter[i], lon_inter[j]])
-                except:
-                    result[k][i][j] = None
-
-    weather[key] = [[[float(value[0]) if value is not None else None for value in row] for row in slice_] for slice_ in
-                    result]
-
-
-def apply_nan_masc(keys_to_iter, weather, land_treshhold):
-    for k in keys_to_iter:
-        if "mask" in k:
-            key_to_nan = k.replace("_mask", "")
-            for t in range(len(weather[key_to_nan])):
-                for l in range(len(weather[key_to_nan][t])):
-                    wl = weather[k][t][l]
-                    for lt in range(len(weather[key_to_nan][t][l])):
-                        wlt = wl[lt]
-                        if wlt is not None:
-                            if wlt >= land_treshhold:
-                                weather[key_to_nan][t][l][lt] = np.NaN
-                        else:
-                            weather[key_to_nan][t][l][lt] = np.NaN
-            # weather.pop(k)
+    """
+    interpolate spatially interpolated slices onto the requested time axis,
+    the output grid is the grid of the slices, so every output time step is a linear blend of the two
+    source time steps around it. Times outside of the source time axis are filled with NaN
+    """
+    weather[key] = _time_chunk(res, time, lat_inter, lon_inter, time_inter)
+
+
+def _time_chunk(res, time, lat_inter, lon_inter, time_inter):
+    time_inter = np.atleast_1d(time_inter)
+    out = np.full((len(time_inter), len(lat_inter), len(lon_inter)), np.nan)
+    if len(time) == 0:
+        return out
+    lower = np.clip(np.searchsorted(time, time_inter, side="right") - 1, 0, max(len(time) - 2, 0))
+    # one output time step at a time, so no more than one output slice is allocated on top of the output
+    for k, (t, i) in enumerate(zip(time_inter, lower)):
+        if t < time[0] or t > time[-1]:
+            continue
+        if t == time[i]:
+            out[k] = res[i]
+        elif t == time[i + 1]:
+            out[k] = res[i + 1]
+        else:
+            weight = (t - time[i]) / (time[i + 1] - time[i])
+            out[k] = (1 - weight) * res[i] + weight * res[i + 1]
+    return out
+
+
+def time_interpolation_all(time, lat_inter, lon_inter, res, keys, time_inter, weather):
+    """
+    interpolate every given variable onto the requested time axis,
+    with more than one worker the variables are split between worker processes
+    """
+    max_workers = config.settings["interpolation"]["max_workers"]
+    if max_workers > 1 and len(keys) > 1:
+        n_in, n_out = len(time), len(np.atleast_1d(time_inter))
+        chunks = [(np.arange(i * n_in, (i + 1) * n_in), np.arange(i * n_out, (i + 1) * n_out), ())
+                  for i in range(len(keys))]
+        out = run_chunks(_time_chunk, np.concatenate([res[key] for key in keys]),
+                         (len(keys) * n_out, len(lat_inter), len(lon_inter)), chunks, max_workers,
+                         time, lat_inter, lon_inter, time_inter)
+        weather.update(zip(keys, np.split(out, len(keys))))
+    else:
+        for key in keys:
+            time_interpolation(time, lat_inter, lon_inter, res[key], key, time_inter, weather)
+
+
+def apply_land_mask(keys, weather, land):
+    """
+    set values of the given variables to NaN over land, for every time step
+    :param land: boolean array of shape (lat_inter, lon_inter), True over land
+    """
+    for key in keys:
+        weather[key][:, land] = np.nan
 
 
 def interpolate_for_copernicus(weather, result, request, requested_time):
@@ -155,52 +195,46 @@ def interpolate_for_copernicus(weather, result, request, requested_time):
             if requested_time[0] != requested_time[-1]:
                 time_inter = np.arange(requested_time[0], requested_time[-1], int(interval * 60))
             else:
-                time_inter = requested_time[0]
-            lat_inter = np.arange(lat[0], lat[-1], resolution)
-            lon_inter = np.arange(lon[0], lon[-1], resolution)
-            weather["time_inter"] = time_inter.tolist()
-            weather["lat_inter"] = lat_inter.tolist()
-            weather["lon_inter"] = lon_inter.tolist()
-
-        lon_grid, lat_grid = np.meshgrid(lon, lat)
-        lon_inter_grid, lat_inter_grid = np.meshgrid(lon_inter, lat_inter)
-        for key in element["data_vars"]:
-            res = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in range(len(time))]
-            key_inter = key + "_inter"
-            result[key_inter] = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in
-                                 range(len(time_inter))]
-            if key != "eastward_wind" and key != "northward_wind":
-                reduced_array = [sublist[0] for sublist in element["data_vars"][key]["data"]]
-            else:
-                reduced_array = element["data_vars"][key]["data"]
-            cop_weather[key] = np.array(reduced_array)
-            cop_weather[key + "_mask"] = np.isnan(cop_weather[key]).astype(float)
-            mask_res = res.copy()
-            latlon_interpolation(time, cop_weather, key, lat_grid, lon_grid, lat_inter_grid, lon_inter_grid, res)
-            latlon_interpolation(time, cop_weather, key + "_mask", lat_grid, lon_grid, lat_inter_grid, lon_inter_grid,
-                                 mask_res)
-            time_interpolation(time, lat_inter, lon_inter, res, key, time_inter, cop_weather)
-            time_interpolation(time, lat_inter, lon_inter, mask_res, key + "_mask", time_inter, cop_weather)
-
-    keys_to_iter = deepcopy(list(cop_weather.keys()))
-    apply_nan_masc(keys_to_iter, cop_weather, land_treshhold)
-    weather_copy = cop_weather.copy()
+                time_inter = np.array([requested_time[0]])
+            coordinates = request.get_coordinates()
+            lat_inter = output_axis(lat, coordinates["latitude"], resolution)
+            lon_inter = output_axis(lon, coordinates["longitude"], resolution)
+            weather["time_inter"] = time_inter
+            weather["lat_inter"] = lat_inter
+            weather["lon_inter"] = lon_inter
+
+        if len(time) == 0:
+            # no time steps of the source around the requested times
+            for key in element.variables:
+                cop_weather[key] = np.full((len(time_inter), len(lat_inter), len(lon_inter)), np.nan)
+            continue
+        steps = bracketing_steps(time, time_inter)
+        time = time[steps]
+        keys = []
+        for key in element.variables:
+            cop_weather[key] = element.values(key, steps)
+            keys.append(key)
+        land = land_masks.get(element.dataset_id, keys, lat, lon, [cop_weather[key] for key in keys],
+                              lat_inter, lon_inter, resolution, land_treshhold)
+        res = latlon_interpolation(time, cop_weather, keys, lat, lon, lat_inter, lon_inter)
+        time_interpolation_all(time, lat_inter, lon_inter, res, keys, time_inter, cop_weather)
+        apply_land_mask(keys, cop_weather, land)
+
     for key in cop_weather:
-        if key[-5:] != "_mask":
-            if key == "zos":
-                weather["tide_height"] = cop_weather[key]
-            else:
-                weather[key] = cop_weather[key]
+        if key == "zos":
+            weather["tide_height"] = cop_weather[key]
+        else:
+            weather[key] = cop_weather[key]
     try:
         curr_request = request.parse_for_copernicus_currents()["request"]
         for e in curr_request:
             if e == "sea_current_direction":
                 key_weather = np.arctan2(weather["uo"], weather["vo"]) * (180 / np.pi) + 180
                 key_weather = np.mod(key_weather, 360)
-                weather[e] = [[[float(value) for value in row] for row in slice_] for slice_ in key_weather]
+                weather[e] = key_weather
             elif e == "sea_current_speed":
                 sea_current_speed = np.sqrt(np.power(weather["uo"], 2) + np.power(weather["vo"], 2))
-                weather[e] = [[[float(value) for value in row] for row in slice_] for slice_ in sea_current_speed]
+                weather[e] = sea_current_speed
 
         if "uo" in weather:
             del weather["uo"]
@@ -213,10 +247,10 @@ def interpolate_for_copernicus(weather, result, request, requested_time):
             if e == "wind_direction":
                 key_weather = np.arctan2(weather["eastward_wind"], weather["northward_wind"]) * (180 / np.pi) + 180
                 key_weather = np.mod(key_weather, 360)
-                weather[e] = [[[float(value) for value in row] for row in slice_] for slice_ in key_weather]
+                weather[e] = key_weather
             elif e == "wind_speed":
                 wind_speed = np.sqrt(np.power(weather["eastward_wind"], 2) + np.power(weather["northward_wind"], 2))
-                weather[e] = [[[float(value) for value in row] for row in slice_] for slice_ in wind_speed]
+                weather[e] = wind_speed
         if "eastward_wind" in weather:
             del weather["eastward_wind"]
             del weather["northward_wind"]
@@ -236,50 +270,49 @@ def interpolate(result, request, requested_time):
     wave_wind_not_inter = result["waves_and_wind"]
     if wave_wind_not_inter is not None:
         lat, lon, time = get_data(wave_wind_not_inter)
-        lat_inter = np.arange(lat[0], lat[-1], resolution)
-        lon_inter = np.arange(lon[0], lon[-1], resolution)
+        coordinates = request.get_coordinates()
+        lat_inter = output_axis(lat, coordinates["latitude"], resolution)
+        lon_inter = output_axis(lon, coordinates["longitude"], resolution)
         if requested_time[0] != requested_time[-1]:
             time_inter = np.arange(requested_time[0], requested_time[-1], int(interval * 60))
         else:
-            time_inter = requested_time[0]
+            time_inter = np.array([requested_time[0]])
 
         keys_to_check = ["dirpw", "swh", "perpw", "u", "v", "ws"]
         keys = []
 
-        check_keys(keys_to_check, wave_wind_not_inter, keys, weather, result, lon_inter, lat_inter, time_inter)
-
-        lon_grid, lat_grid = np.meshgrid(lon, lat)
-        lon_inter_grid, lat_inter_grid = np.meshgrid(lon_inter, lat_inter)
-        res = [[[0] * len(lon_inter) for _ in range(len(lat_inter))] for _ in range(len(time))]
-
+        check_keys(keys_to_check, wave_wind_not_inter, keys, weather)
+        # only the source time steps bracketing the requested times are interpolated spatially
+        steps = bracketing_steps(time, time_inter)
+        time = time[steps]
         for key in keys:
-            latlon_interpolation(time, weather, key, lat_grid, lon_grid, lat_inter_grid, lon_inter_grid, res)
-            time_interpolation(time, lat_inter, lon_inter, res, key, time_inter, weather)
+            weather[key] = weather[key][steps]
+        land = land_masks.get(data_source.cache_id(NOAA_DATASET_ID), keys, lat, lon, [weather[key] for key in keys],
+                              lat_inter, lon_inter, resolution, land_treshhold)
 
-        keys_to_iter = deepcopy(list(weather.keys()))
-
-        apply_nan_masc(keys_to_iter, weather, land_treshhold)
+        res = latlon_interpolation(time, weather, keys, lat, lon, lat_inter, lon_inter)
+        time_interpolation_all(time, lat_inter, lon_inter, res, keys, time_inter, weather)
+        apply_land_mask(keys, weather, land)
         weather_copy = weather.copy()
         for el in weather_copy:
             if el[-2:] == "_x":
                 key = el[:-2]
                 key_weather = np.rad2deg(np.arctan2(weather[key + "_y"], weather[key + "_x"]))
                 key_weather = np.mod(key_weather, 360)
-                weather[key] = [[[float(value) for value in row] for row in slice_] for slice_ in key_weather]
+                weather[key] = key_weather
                 del weather[key + "_x"]
                 del weather[key + "_y"]
             elif el == "v":
                 key = "wind_direction"
                 key_weather = np.arctan2(weather["u"], weather["v"]) * (180 / np.pi) + 180
                 key_weather = np.mod(key_weather, 360)
-                weather[key] = [[[float(value) for value in row] for row in slice_] for slice_ in key_weather]
+                weather[key] = key_weather
                 del weather["u"]
                 del weather["v"]
-            elif el[-4:] == "mask":
-                del weather[el]
         print("Interpolation complete")
-        weather["time_inter"] = time_inter.tolist()
-        weather["lat_inter"] = lat_inter.tolist()
-        weather["lon_inter"] = lon_inter.tolist()
+        weather["time_inter"] = time_inter
+        weather["lat_inter"] = lat_inter
+        weather["lon_inter"] = lon_inter
 
-    return interpolate_for_copernicus(weather, result, request, requested_time)
+    weather = interpolate_for_copernicus(weather, result, request, requested_time)
+    return weather
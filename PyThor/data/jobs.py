@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PyThor.utilities.files import atomic_write
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    A class that computes requests in the background on a bounded pool of threads, so clients submit a request,
+    poll its progress and download the result later instead of holding a connection open.
+    The state of every job is kept in a file of the jobs folder, so any server process can report, cancel
+    and serve the jobs of the others. Running jobs are cancelled between the fetching, interpolating and
+    serializing stages. Finished jobs are deleted after the ttl
+    """
+
+    def __init__(self, folder, compute, max_workers, max_jobs, ttl, clock=time.time):
+        """
+        :param folder: folder of the job files
+        :param compute: function computing the JSON encoded result of a DataRequest, called as
+        compute(data_request, time, progress) with time as [start, end] unix timestamps and progress a function
+        called with the name of every stage started, returning None when no data could be fetched
+        :param max_workers: number of jobs computed at the same time
+        :param max_jobs: number of jobs of this process that may be queued or running
+        :param ttl: seconds finished jobs and their results are kept
+        :param clock: function returning the current unix time
+        """
+        self.folder = folder
+        self.compute = compute
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pythor-job")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def __path(self, job_id, suffix=".json"):
+        return self.folder / (job_id + suffix)
+
+    def __write(self, job_id, data, suffix=".json"):
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+        atomic_write(self.__path(job_id, suffix), write)
+
+    def __update(self, job_id, **changes) -> dict:
+        with self._lock:
+            job = self.status(job_id)
+            if job is None or job["state"] == "cancelled":
+                raise JobCancelled()
+            job.update(changes)
+            self.__write(job_id, json.dumps(job).encode())
+            return job
+
+    def status(self, job_id):
+        """
+        :param job_id: id returned by submit
+        :return: a dict structured like:
+            - id : id of the job
+            - state : queued, running, done, failed or cancelled
+            - stage : fetching, interpolating or serializing while running, otherwise None
+            - created, started, finished : unix timestamps
+            - error : reason the job failed
+        or None if the job does not exist
+        """
+        if not re.fullmatch("[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self.__path(job_id), 'rb') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def submit(self, data_request, time):
+        """
+        queue the computation of a request
+        :param data_request: valid DataRequest
+        :param time: [start, end] of the request as unix timestamps
+        :return: status of the job, see status, or None if too many jobs are queued
+        """
+        self.expire()
+        with self._lock:
+            if len(self._futures) >= self.max_jobs:
+                return None
+            job_id = uuid.uuid4().hex
+            job = {"id": job_id, "state": "queued", "stage": None, "created": self.clock(), "started": None,
+                   "finished": None, "error": None}
+            self.__write(job_id, json.dumps(job).encode())
+            self._futures[job_id] = self.executor.submit(self._run, job_id, data_request, time)
+        return job
+
+    def _run(self, job_id, data_request, time):
+        try:
+            self.__update(job_id, state="running", started=self.clock())
+            res = self.compute(data_request, time, lambda stage: self.__update(job_id, stage=stage))
+            if res is None:
+                self.__update(job_id, state="failed", stage=None, finished=self.clock(), error="no data available")
+            else:
+                self.__write(job_id, res if isinstance(res, bytes) else b"".join(res), ".result")
+                self.__update(job_id, state="done", stage=None, finished=self.clock())
+        except JobCancelled:
+            print(f"Job {job_id} cancelled")
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            try:
+                self.__update(job_id, state="failed", stage=None, finished=self.clock(), error=str(e))
+            except (JobCancelled, OSError):
+                pass
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+
+    def result(self, job_id):
+        """
+        :param job_id: id returned by submit
+        :return: JSON encoded result of a finished job, or None if the job is not done
+        """
+        job = self.status(job_id)
+        if job is None or job["state"] != "done":
+            return None
+        try:
+            with open(self.__path(job_id, ".result"), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def cancel(self, job_id):
+        """
+        cancel a queued or running job, a running job stops at the start of its next stage
+        :param job_id: id returned by submit
+        :return: status of the job or None if the job does not exist
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                self._futures.pop(job_id)
+            job = self.status(job_id)
+            if job is None or job["state"] not in ("queued", "running"):
+                return job
+            job.update(state="cancelled", stage=None, finished=self.clock())
+            self.__write(job_id, json.dumps(job).encode())
+            return job
+
+    def expire(self):
+        """
+        delete the jobs finished longer than the ttl ago with their results
+        """
+        for f in os.listdir(self.folder):
+            if not f.endswith(".json"):
+                continue
+            job_id = f[:-len(".json")]
+            job = self.status(job_id)
+            if job is None or job["finished"] is None or self.clock() - job["finished"] < self.ttl:
+                continue
+            for suffix in (".result", ".json"):
+                try:
+                    os.remove(self.__path(job_id, suffix))
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from PyThor.app_pythor import config
+from PyThor.config.config import masks_folder
+from PyThor.utilities.files import atomic_write, evict_lru, mark_used
+
+
+class LandMaskCache:
+    """
+    A class that computes static land/sea masks of the output grid once per
+    (dataset id, variables, bounding box, resolution, land threshold) and persists them on disk.
+    The most recently used masks are kept in a size bounded in-memory LRU, the folder is bounded in size
+    with least recently used eviction as well
+    """
+
+    def __init__(self, folder, max_size_mb, memory_mb):
+        """
+        :param folder: folder of the mask files
+        :param max_size_mb: size limit of the folder
+        :param memory_mb: size limit of the masks kept in memory
+        """
+        self.folder = folder
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.memory_size = int(memory_mb * 1024 * 1024)
+        self._masks = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(dataset_id, variables, lat_inter, lon_inter, resolution, land_treshhold) -> str:
+        bbox = (float(lat_inter[0]), float(lat_inter[-1]), float(lon_inter[0]), float(lon_inter[-1]),
+                len(lat_inter), len(lon_inter))
+        return hashlib.sha1(repr((dataset_id, sorted(variables), bbox, float(resolution),
+                                  float(land_treshhold))).encode()).hexdigest()
+
+    def get(self, dataset_id, variables, lat, lon, fields, lat_inter, lon_inter, resolution, land_treshhold):
+        """
+        get the land mask of the output grid, computing it from the source fields on the first use
+        :param dataset_id: id of the source dataset supplying the fields
+        :param variables: names of the fields, variables of one dataset may have data over different areas
+        :param lat: source latitude axis
+        :param lon: source longitude axis
+        :param fields: list of source arrays of shape (time, lat, lon), NaN over land
+        :return: boolean array of shape (lat_inter, lon_inter), True over land
+        """
+        key = self.key(dataset_id, variables, lat_inter, lon_inter, resolution, land_treshhold)
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        path = self.folder / (key + ".npy")
+        try:
+            mask = np.load(path)
+            mark_used(path)
+        except (FileNotFoundError, ValueError, OSError):
+            mask = land_fraction(lat, lon, fields, lat_inter, lon_inter) >= land_treshhold
+            self._save(path, mask)
+        self.__remember(key, mask)
+        return mask
+
+    def __remember(self, key, mask):
+        if mask.nbytes > self.memory_size:
+            return
+        with self._lock:
+            if key in self._masks:
+                self._memory_used -= self._masks.pop(key).nbytes
+            self._masks[key] = mask
+            self._memory_used += mask.nbytes
+            while self._memory_used > self.memory_size:
+                self._memory_used -= self._masks.popitem(last=False)[1].nbytes
+
+    def _save(self, path, mask):
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                np.save(f, mask)
+
+        try:
+            atomic_write(path, write)
+        except OSError:
+            return
+        evict_lru(self.folder, ".npy", self.max_size)
+
+
+def land_fraction(lat, lon, fields, lat_inter, lon_inter):
+    """
+    bilinearly interpolate the static land indicator of the source grid onto the output grid
+    a source cell is land when one of the fields never has data there,
+    points outside of the source grid count as land
+    :return: array of shape (lat_inter, lon_inter) with values between 0 (sea) and 1 (land)
+    """
+    land = np.zeros((len(lat), len(lon)), dtype=bool)
+    for field in fields:
+        land |= np.isnan(field).all(axis=0)
+    if len(lat) < 2 or len(lon) < 2:
+        return np.full((len(lat_inter), len(lon_inter)), float(land.any()))
+    interpolator = RegularGridInterpolator((lat, lon), land.astype(float), bounds_error=False, fill_value=1.0)
+    lon_inter_grid, lat_inter_grid = np.meshgrid(lon_inter, lat_inter)
+    return interpolator((lat_inter_grid, lon_inter_grid))
+
+
+land_masks = LandMaskCache(masks_folder, config.settings["land_masks"]["max_size_mb"],
+                           config.settings["land_masks"]["memory_mb"])
@@ -0,0 +1,103 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers) -> ProcessPoolExecutor:
+    """
+    get the process pool shared by all requests, it is (re)created when the number of workers changes
+    the workers are started by a fork server (spawned on Windows), forking the multithreaded server process
+    could copy locks held by its other threads into the workers
+    :param max_workers: number of worker processes
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+            _pool_workers = max_workers
+        return _pool
+
+
+class SharedArray:
+    """
+    A class that keeps a numpy array in shared memory, so worker processes can read and write it without pickling
+    """
+
+    def __init__(self, shape, dtype=float, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        shared = cls(np.shape(array), np.asarray(array).dtype)
+        shared.array[...] = array
+        return shared
+
+    def descriptor(self) -> tuple:
+        """
+        :return: a picklable (name, shape, dtype) tuple allowing other processes to attach to the array
+        """
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, shape, dtype = descriptor
+        return cls(shape, dtype, name)
+
+    def close(self, unlink=False):
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _chunk_task(func, source, target, source_idx, target_idx, chunk_args, args):
+    source = SharedArray.attach(source)
+    target = SharedArray.attach(target)
+    try:
+        target.array[target_idx] = func(source.array[source_idx], *chunk_args, *args)
+    finally:
+        source.close()
+        target.close()
+
+
+def run_chunks(func, array, out_shape, chunks, max_workers, *args):
+    """
+    apply func to chunks of array in the process pool,
+    the input and the output are passed to the workers through shared memory
+    :param func: picklable function called as func(array[source_idx], *chunk_args, *args),
+    returning the values of output[target_idx]
+    :param array: input array
+    :param out_shape: shape of the output array
+    :param chunks: list of (source_idx, target_idx, chunk_args) tuples of indices and arguments of every chunk
+    :param max_workers: number of worker processes
+    :return: output array
+    """
+    source = SharedArray.from_array(np.asarray(array, dtype=float))
+    target = SharedArray(out_shape, float)
+    try:
+        futures = [get_pool(max_workers).submit(_chunk_task, func, source.descriptor(), target.descriptor(),
+                                                source_idx, target_idx, chunk_args, args)
+                   for source_idx, target_idx, chunk_args in chunks]
+        for future in futures:
+            future.result()
+        return target.array.copy()
+    finally:
+        source.close(unlink=True)
+        target.close(unlink=True)
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytz
+
+from PyThor.data.cycles import published_cycle
+from PyThor.data.data_request import DataRequest
+
+
+class Prefetcher:
+    """
+    A class that fetches and interpolates the configured regions in the background as soon as a new
+    00, 06, 12 or 18 forecast cycle is available, so user requests for these regions hit warm caches
+    """
+
+    def __init__(self, regions, compute, horizon, availability_delay, poll_interval, max_workers, clock=time.time):
+        """
+        :param regions: list of dicts with the name, latitude [start, end], longitude [start, end],
+        variables and interval (minutes) of every region
+        :param compute: function fetching and interpolating a DataRequest, called as compute(data_request, time)
+        with time as [start, end] unix timestamps, returning None when no data could be fetched
+        :param horizon: hours after the cycle start to prefetch
+        :param availability_delay: hours after the cycle start until its data is published
+        :param poll_interval: seconds between checks for a new cycle
+        :param max_workers: number of regions prefetched at the same time
+        :param clock: function returning the current unix time
+        """
+        self.regions = regions
+        self.compute = compute
+        self.horizon = horizon
+        self.availability_delay = availability_delay
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pythor-prefetch")
+        self.cycle = None
+        self.status = {region["name"]: {"state": "idle", "cycle": None, "started": None, "finished": None,
+                                        "error": None} for region in regions}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def latest_cycle(self) -> int:
+        """
+        :return: start of the latest published forecast cycle as unix timestamp
+        """
+        return published_cycle(self.clock(), 6, self.availability_delay)
+
+    def request(self, region, cycle) -> DataRequest:
+        return DataRequest(region["latitude"][0], region["latitude"][1], region["longitude"][0],
+                           region["longitude"][1], cycle, cycle + int(self.horizon * 3600), region["interval"],
+                           region["variables"])
+
+    def check(self) -> bool:
+        """
+        submit the prefetch of every region when a new cycle is available,
+        a region still being prefetched for an older cycle is skipped
+        :return: True if a new cycle was found
+        """
+        cycle = self.latest_cycle()
+        if cycle == self.cycle:
+            return False
+        self.cycle = cycle
+        print(f"Prefetching forecast cycle {datetime.fromtimestamp(cycle, pytz.utc):%Y-%m-%d %H}z")
+        for region in self.regions:
+            with self._lock:
+                status = self.status[region["name"]]
+                if status["state"] in ("queued", "running"):
+                    continue
+                status.update(state="queued", cycle=cycle, error=None)
+            self.executor.submit(self._prefetch, region, cycle)
+        return True
+
+    def _prefetch(self, region, cycle):
+        status = self.status[region["name"]]
+        with self._lock:
+            status.update(state="running", started=self.clock(), finished=None)
+        try:
+            data_request = self.request(region, cycle)
+            if not data_request.is_valid():
+                raise ValueError("invalid region")
+            res = self.compute(data_request, [cycle, cycle + int(self.horizon * 3600)])
+            state, error = ("done", None) if res is not None else ("failed", "no data available")
+        except Exception as e:
+            print(f"Prefetching {region['name']} failed: {e}")
+            state, error = "failed", str(e)
+        with self._lock:
+            status.update(state=state, finished=self.clock(), error=error)
+
+    def report(self) -> dict:
+        """
+        :return: a dict structured like:
+            - cycle : start of the latest prefetched cycle as unix timestamp
+            - regions : dict with the state (idle, queued, running, done or failed), cycle, start and end time
+            and error of the last prefetch of every region
+        """
+        with self._lock:
+            return {"cycle": self.cycle, "regions": {name: dict(s) for name, s in self.status.items()}}
+
+    def run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Prefetch check failed: {e}")
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def start(self):
+        """
+        start checking for new cycles in a background thread
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="pythor-prefetch-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
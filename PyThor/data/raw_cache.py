@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import xarray as xr
+
+from PyThor.app_pythor import config
+from PyThor.config.config import raw_folder
+from PyThor.data.cycles import published_cycle
+from PyThor.utilities.files import atomic_write, evict_lru, mark_used
+
+# the netCDF and HDF5 libraries are not thread safe, every read and write of the cache goes through this lock
+netcdf_lock = threading.Lock()
+
+
+class RawDataCache:
+    """
+    A class that keeps fetched source data on disk as NetCDF, split into spatial tiles and time chunks,
+    so requests overlapping earlier ones only download the tiles and chunks they do not share.
+    The cache is bounded in size with least recently used eviction, chunks that contained forecast data
+    expire once a newer forecast cycle is published, availability_delay hours after it starts
+    """
+
+    def __init__(self, folder, max_size_mb, tile_size, chunk_hours, cycle_hours, availability_delay):
+        self.folder = folder
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.tile_size = float(tile_size)
+        self.chunk_seconds = int(chunk_hours * 3600)
+        self.cycle_seconds = int(cycle_hours * 3600)
+        self.availability_delay = availability_delay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def tiles(self, latitude, longitude) -> list[tuple[int, int]]:
+        """
+        :param latitude: [start, end] of the area
+        :param longitude: [start, end] of the area
+        :return: indices of the tiles covering the area
+        """
+        lat = range(int(np.floor(latitude[0] / self.tile_size)), int(np.floor(latitude[1] / self.tile_size)) + 1)
+        lon = range(int(np.floor(longitude[0] / self.tile_size)), int(np.floor(longitude[1] / self.tile_size)) + 1)
+        return [(i, j) for i in lat for j in lon]
+
+    def chunks(self, time_start, time_end) -> list[int]:
+        """
+        :param time_start: unix timestamp
+        :param time_end: unix timestamp
+        :return: indices of the time chunks covering the time range
+        """
+        return list(range(time_start // self.chunk_seconds, time_end // self.chunk_seconds + 1))
+
+    def tile_bounds(self, tile) -> tuple[float, float, float, float]:
+        """
+        :return: latitude start, latitude end, longitude start and longitude end of the tile
+        """
+        return (tile[0] * self.tile_size, (tile[0] + 1) * self.tile_size,
+                tile[1] * self.tile_size, (tile[1] + 1) * self.tile_size)
+
+    def chunk_bounds(self, chunk) -> tuple[int, int]:
+        """
+        :return: start and end of the time chunk as unix timestamps, the end is excluded
+        """
+        return chunk * self.chunk_seconds, (chunk + 1) * self.chunk_seconds
+
+    def current_cycle(self) -> int:
+        """
+        :return: start of the latest published forecast cycle as unix timestamp
+        """
+        return published_cycle(time.time(), self.cycle_seconds / 3600, self.availability_delay)
+
+    def split(self, dataset, tile, chunk) -> xr.Dataset:
+        """
+        keep the points of the dataset belonging to the tile and the time chunk,
+        so a point on a tile edge is stored in exactly one tile
+        """
+        lat = np.floor(dataset["latitude"].values / self.tile_size) == tile[0]
+        lon = np.floor(dataset["longitude"].values / self.tile_size) == tile[1]
+        steps = dataset["time"].values.astype('datetime64[s]').astype('int64') // self.chunk_seconds == chunk
+        return dataset.isel(latitude=np.flatnonzero(lat), longitude=np.flatnonzero(lon), time=np.flatnonzero(steps))
+
+    @staticmethod
+    def key(dataset_id, variable, tile, chunk) -> str:
+        return hashlib.sha1(repr((dataset_id, variable, tuple(tile), int(chunk))).encode()).hexdigest()
+
+    def __path(self, key):
+        return self.folder / (key + ".nc")
+
+    def load(self, dataset_id, variable, tile, chunk):
+        """
+        load a variable of one tile and time chunk
+        :return: xarray dataset or None if it is not cached or expired
+        """
+        path = self.__path(self.key(dataset_id, variable, tile, chunk))
+        try:
+            with netcdf_lock:
+                dataset = xr.load_dataset(path)
+        except (FileNotFoundError, ValueError, OSError):
+            self.__count(hit=False)
+            return None
+        cycle = int(dataset.attrs.get("pythor_cycle", 0))
+        if cycle < self.current_cycle() and self.chunk_bounds(chunk)[1] > cycle:
+            # the chunk held data that a newer forecast cycle replaces
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.__count(hit=False)
+            return None
+        mark_used(path)
+        self.__count(hit=True)
+        return dataset
+
+    def __count(self, hit):
+        # loads run on the threads of concurrent fetches
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self, dataset_id, variable, tile, chunk, dataset):
+        """
+        atomically store a variable of one tile and time chunk and evict old entries above the size limit
+        """
+        dataset = dataset.copy()
+        dataset.attrs["pythor_cycle"] = self.current_cycle()
+        try:
+            with netcdf_lock:
+                atomic_write(self.__path(self.key(dataset_id, variable, tile, chunk)), dataset.to_netcdf)
+        except (OSError, ValueError, RuntimeError):
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        delete least recently used entries until the cache fits in its size limit
+        """
+        evict_lru(self.folder, ".nc", self.max_size)
+
+    def stats(self) -> dict:
+        """
+        :return: hit and miss counters of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+raw_cache = None
+if config.settings["raw_cache"]["active"]:
+    raw_cache = RawDataCache(raw_folder, config.settings["raw_cache"]["max_size_mb"],
+                             config.settings["raw_cache"]["tile_size"], config.settings["raw_cache"]["chunk_hours"],
+                             config.settings["raw_cache"]["cycle_hours"],
+                             config.settings["prefetch"]["availability_delay"])
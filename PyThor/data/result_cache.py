@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from PyThor.app_pythor import config
+from PyThor.config.config import cache_folder
+from PyThor.data.cycles import published_cycle
+from PyThor.utilities.files import atomic_write, evict_lru, mark_used
+
+
+# arrays of a stored result start at multiples of this many bytes
+ALIGNMENT = 64
+
+
+def encode(arrays):
+    """
+    encode a result as JSON piece by piece, so only one time step of a variable is converted to python objects
+    at a time. The output is identical to json.dumps of the result converted to lists
+    :param arrays: dict of numpy arrays, possibly memory mapped
+    :return: generator of bytes
+    """
+    yield b"{"
+    for n, (key, value) in enumerate(arrays.items()):
+        yield (", " if n else "").encode() + json.dumps(key).encode() + b": "
+        if np.ndim(value) < 2:
+            yield json.dumps(np.asarray(value).tolist()).encode()
+            continue
+        yield b"["
+        for i in range(len(value)):
+            yield (", " if i else "").encode() + json.dumps(np.asarray(value[i]).tolist()).encode()
+        yield b"]"
+    yield b"}"
+
+
+class ResultCache:
+    """
+    A class that stores the interpolated results of API requests under hashed request keys in two tiers:
+    a size bounded in-memory LRU of the hot results, already encoded as JSON, in front of the disk,
+    which is bounded in size with least recently used eviction as well. On disk every result is a one line
+    JSON header followed by the contiguous binary arrays of its axes and variables, which are memory mapped
+    when read, so slicing or encoding a result only reads the parts it needs.
+    Results reaching past the start of the forecast cycle they were computed in expire once a newer cycle
+    is published, availability_delay hours after it starts
+    """
+
+    def __init__(self, folder, max_size_mb, memory_mb, cycle_hours, availability_delay):
+        self.folder = folder
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.memory_size = int(memory_mb * 1024 * 1024)
+        self.cycle_seconds = int(cycle_hours * 3600)
+        self.availability_delay = availability_delay
+        self.memory_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    def current_cycle(self) -> int:
+        """
+        :return: start of the latest published forecast cycle as unix timestamp
+        """
+        return published_cycle(time.time(), self.cycle_seconds / 3600, self.availability_delay)
+
+    def expired(self, cycle, time_end) -> bool:
+        """
+        :param cycle: forecast cycle the result was computed in
+        :param time_end: end of the requested time range
+        :return: True if the result was computed from forecasts that a newer cycle replaces
+        """
+        return cycle < self.current_cycle() and time_end > cycle
+
+    def __path(self, key):
+        return self.folder / (key + ".result")
+
+    def arrays(self, key):
+        """
+        memory map the arrays of the result stored on disk under the key
+        :param key: DataRequest.cache_key
+        :return: tuple of the header and a dict of read-only arrays, or None if it is not cached or expired
+        """
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                line = f.readline()
+            header = json.loads(line)
+            if self.expired(header["cycle"], header["time_end"]):
+                os.remove(path)
+                self.__count(hit=False)
+                return None
+            start = -(-len(line) // ALIGNMENT) * ALIGNMENT
+            arrays = {}
+            for name, spec in header["arrays"].items():
+                if np.prod(spec["shape"]) == 0:
+                    arrays[name] = np.empty(spec["shape"], dtype=spec["dtype"])
+                else:
+                    arrays[name] = np.memmap(path, dtype=spec["dtype"], mode='r', offset=start + spec["offset"],
+                                             shape=tuple(spec["shape"]))
+        except (ValueError, KeyError, OSError):
+            self.__count(hit=False)
+            return None
+        mark_used(path)
+        self.__count(hit=True)
+        return header, arrays
+
+    def __count(self, hit):
+        # results are read by concurrent request threads
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def load(self, key):
+        """
+        load the result stored under the key, from memory if possible
+        :param key: DataRequest.cache_key
+        :return: JSON encoded result or None if it is not cached or expired. Results larger than the memory tier
+        are returned as a generator of bytes, encoded while they are sent
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self.expired(entry[1], entry[2]):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                self.__forget(key)
+        stored = self.arrays(key)
+        if stored is None:
+            return None
+        header, arrays = stored
+        if sum(a.nbytes for a in arrays.values()) > self.memory_size:
+            return encode(arrays)
+        body = b"".join(encode(arrays))
+        self.__remember(key, body, header["cycle"], header["time_end"])
+        return body
+
+    def save(self, key, result, time_end, coverage=None) -> bytes:
+        """
+        encode the result, keep it in memory and atomically store it on disk,
+        then evict old entries above the size limit
+        :param key: DataRequest.cache_key
+        :param result: dict of numpy arrays returned by interpolate
+        :param time_end: end of the requested time range as unix timestamp
+        :param coverage: optional description of the area, time axis and variables of the result,
+        see CoverageIndex.coverage
+        :return: JSON encoded result
+        """
+        arrays = {name: np.ascontiguousarray(value) for name, value in result.items()}
+        body = b"".join(encode(arrays))
+        cycle, time_end = self.current_cycle(), int(time_end)
+        self.__remember(key, body, cycle, time_end)
+        # a one line header keeps the expiry data, the coverage and the layout of the arrays
+        # readable without reading the arrays
+        header = {"cycle": cycle, "time_end": time_end, "arrays": {}}
+        if coverage is not None:
+            header["coverage"] = coverage
+        offset = 0
+        for name, value in arrays.items():
+            header["arrays"][name] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+            offset += -(-value.nbytes // ALIGNMENT) * ALIGNMENT
+        line = json.dumps(header).encode() + b"\n"
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(line.ljust(-(-len(line) // ALIGNMENT) * ALIGNMENT, b" "))
+                for value in arrays.values():
+                    f.write(value.tobytes())
+                    f.write(b"\0" * (-value.nbytes % ALIGNMENT))
+
+        try:
+            atomic_write(self.__path(key), write)
+        except OSError:
+            return body
+        self.evict()
+        return body
+
+    def headers(self):
+        """
+        read the headers of all results stored on disk
+        :return: generator of (key, header dict) tuples
+        """
+        for f in os.listdir(self.folder):
+            if f.endswith(".result"):
+                try:
+                    with open(self.folder / f, 'rb') as file:
+                        header = json.loads(file.readline())
+                    expired = self.expired(header["cycle"], header["time_end"])
+                except (ValueError, KeyError, OSError):
+                    continue
+                if not expired:
+                    yield f[:-len(".result")], header
+
+    def __remember(self, key, body, cycle, time_end):
+        if len(body) > self.memory_size:
+            return
+        with self._lock:
+            self.__forget(key)
+            self._memory[key] = (body, cycle, time_end)
+            self._memory_used += len(body)
+            while self._memory_used > self.memory_size:
+                self.__forget(next(iter(self._memory)))
+
+    def __forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_used -= len(entry[0])
+
+    def evict(self):
+        """
+        delete least recently used results until the cache fits in its size limit
+        """
+        evict_lru(self.folder, ".result", self.max_size)
+
+    def stats(self) -> dict:
+        """
+        :return: memory hit, disk hit and miss counters of the cache
+        """
+        with self._lock:
+            return {"memory_hits": self.memory_hits, "hits": self.hits, "misses": self.misses}
+
+
+result_cache = ResultCache(cache_folder, config.settings["result_cache"]["max_size_mb"],
+                           config.settings["result_cache"]["memory_mb"], config.settings["result_cache"]["cycle_hours"],
+                           config.settings["prefetch"]["availability_delay"])
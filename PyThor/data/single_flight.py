@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from PyThor.app_pythor import config
+from PyThor.config.config import cache_folder
+
+try:
+    import msvcrt
+except ImportError:  # not on Windows
+    msvcrt = None
+    import fcntl
+
+
+def _try_lock(f) -> bool:
+    try:
+        if msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def hold_lock(path):
+    """
+    lock a file for the lifetime of the process, so a task shared by several server processes runs in one of them
+    :param path: path of the lock file
+    :return: the open locked file, which must be kept referenced, or None if another process holds the lock
+    """
+    try:
+        f = open(path, "a+b")
+    except OSError:
+        return None
+    if _try_lock(f):
+        return f
+    f.close()
+    return None
+
+
+class SingleFlight:
+    """
+    A class that lets a single thread of a single process compute the result of a request at a time,
+    identical requests arriving meanwhile wait for it and then find the result in the cache.
+    Threads wait on a lock per request key, processes on one of a fixed number of lock files,
+    so unrelated requests sharing a lock file may occasionally wait for each other
+    """
+
+    def __init__(self, folder, stripes, timeout):
+        """
+        :param folder: folder of the lock files
+        :param stripes: number of lock files
+        :param timeout: seconds after which a waiting request computes the result itself
+        """
+        self.folder = folder
+        self.stripes = stripes
+        self.timeout = timeout
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __thread_lock(self, key) -> list:
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry
+
+    def __release_thread_lock(self, key):
+        with self._lock:
+            entry = self._locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    @contextmanager
+    def claim(self, key):
+        """
+        wait until no other thread or process is computing the result of the key
+        :param key: DataRequest.cache_key
+        """
+        deadline = time.monotonic() + self.timeout
+        entry = self.__thread_lock(key)
+        acquired = entry[0].acquire(timeout=self.timeout)
+        stripe = int(hashlib.sha1(key.encode()).hexdigest(), 16) % self.stripes
+        f = None
+        locked = False
+        try:
+            try:
+                f = open(self.folder / f"flight_{stripe}.lock", "a+b")
+                locked = _try_lock(f)
+                while not locked and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    locked = _try_lock(f)
+            except OSError:
+                pass
+            if not (acquired and locked):
+                print("Waiting for an identical request timed out")
+            yield
+        finally:
+            if f is not None:
+                if locked:
+                    _unlock(f)
+                f.close()
+            if acquired:
+                entry[0].release()
+            self.__release_thread_lock(key)
+
+
+single_flight = SingleFlight(cache_folder, config.settings["result_cache"]["lock_stripes"],
+                             config.settings["result_cache"]["lock_timeout"])
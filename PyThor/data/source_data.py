@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class SourceData:
+    """
+    A class that carries a fetched (lazily loaded) xarray dataset straight into interpolation,
+    exposing its grid, time axis and variables as numpy arrays
+    """
+
+    def __init__(self, dataset_id, dataset):
+        self.dataset_id = dataset_id
+        self.dataset = dataset
+
+    @property
+    def latitude(self) -> np.ndarray:
+        return self.dataset["latitude"].values
+
+    @property
+    def longitude(self) -> np.ndarray:
+        return self.dataset["longitude"].values
+
+    @property
+    def time(self) -> np.ndarray:
+        """
+        :return: time axis as unix timestamps
+        """
+        return self.dataset["time"].values.astype('datetime64[s]').astype('int64')
+
+    @property
+    def variables(self) -> list[str]:
+        return list(self.dataset.data_vars)
+
+    def values(self, variable, steps=None) -> np.ndarray:
+        """
+        load a variable as an array of shape (time, latitude, longitude), taking the surface level of 3D fields
+        :param variable: variable name
+        :param steps: optional indices of the time steps to load, only these are read from the dataset
+        :return: float array, NaN where there is no data
+        """
+        data = self.dataset[variable]
+        if "depth" in data.dims:
+            data = data.isel(depth=0)
+        if steps is not None:
+            data = data.isel(time=np.asarray(steps))
+        return np.asarray(data.transpose("time", "latitude", "longitude").values, dtype=float)
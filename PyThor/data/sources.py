@@ -0,0 +1,267 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+import requests
+import xarray as xr
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+from PyThor.app_pythor import config
+from PyThor.data.copernicus import copernicus_session, dataset_metadata
+from PyThor.data.grib import decode_grib
+
+
+class DataSource(ABC):
+    """
+    Base class of the backends the Fetcher reads data from: lazily opened copernicus datasets
+    and hourly NOAA forecast files
+    """
+    name = "remote"
+
+    def cache_id(self, dataset_id) -> str:
+        """
+        :return: id under which data of the dataset is stored in the local caches
+        """
+        return dataset_id
+
+    @abstractmethod
+    def dataset(self, dataset_id) -> xr.Dataset:
+        """
+        :param dataset_id: copernicus dataset id
+        :return: the whole dataset, lazily opened
+        """
+
+    def metadata(self, dataset_id) -> dict:
+        """
+        :param dataset_id: copernicus dataset id
+        :return: catalogue metadata of the dataset, see copernicus.dataset_metadata
+        """
+        return dataset_metadata(self.dataset(dataset_id))
+
+    @abstractmethod
+    def noaa_download(self, download):
+        """
+        :param download: dict returned by Fetcher.noaa_downloads
+        :return: content of the NOAA file or None if it could not be downloaded
+        """
+
+    @abstractmethod
+    def noaa_decode(self, content) -> dict:
+        """
+        :param content: value returned by noaa_download
+        :return: decoded file, see grib.decode_grib
+        """
+
+
+_noaa_session = None
+_noaa_session_lock = threading.Lock()
+
+
+def noaa_session() -> requests.Session:
+    """
+    get the HTTP session shared by all NOAA downloads, keeping connections to NOMADS alive between requests
+    failed requests are retried with exponential backoff
+    """
+    global _noaa_session
+    with _noaa_session_lock:
+        if _noaa_session is None:
+            retry = Retry(total=config.settings["fetching"]["retries"],
+                          backoff_factor=config.settings["fetching"]["backoff"],
+                          status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=["GET"])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.settings["fetching"]["noaa_workers"],
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _noaa_session = session
+        return _noaa_session
+
+
+class RemoteSource(DataSource):
+    """
+    A class reading data from the copernicus marine service and the NOAA NOMADS server
+    """
+
+    def dataset(self, dataset_id) -> xr.Dataset:
+        return copernicus_session.dataset(dataset_id)
+
+    def metadata(self, dataset_id) -> dict:
+        return copernicus_session.metadata(dataset_id)
+
+    def noaa_download(self, download):
+        """
+        download a single NOAA GRIB file into memory through the shared session,
+        retrying failed requests with backoff
+        """
+        try:
+            response = noaa_session().get(download["url"], timeout=config.settings["fetching"]["timeout"])
+            response.raise_for_status()
+            return response.content
+        except requests.RequestException as e:
+            print(f"Downloading {download['filename']} failed: {e}")
+            return None
+
+    def noaa_decode(self, content) -> dict:
+        return decode_grib(content)
+
+
+# grid step (degrees), time step and offset (seconds), depth axis and variables of the synthetic copernicus datasets
+# every variable is given as standard name, mean and amplitude
+SYNTHETIC_DATASETS = {
+    "cmems_mod_glo_phy-cur_anfc_0.083deg_PT6H-i": {
+        "step": 1 / 12, "time_step": 6 * 3600, "time_offset": 0, "depth": True,
+        "variables": {"uo": ("eastward_sea_water_velocity", 0.1, 0.5),
+                      "vo": ("northward_sea_water_velocity", 0.0, 0.5)}},
+    "cmems_mod_glo_phy_anfc_0.083deg_PT1H-m": {
+        "step": 1 / 12, "time_step": 3600, "time_offset": 1800, "depth": False,
+        "variables": {"zos": ("sea_surface_height_above_geoid", 0.0, 0.6)}},
+    "cmems_obs-wind_glo_phy_nrt_l4_0.125deg_PT1H": {
+        "step": 0.125, "time_step": 3600, "time_offset": 0, "depth": False,
+        "variables": {"eastward_wind": ("eastward_wind", 2.0, 8.0),
+                      "northward_wind": ("northward_wind", -1.0, 8.0)}},
+}
+# NOAA variables of the API request with the GRIB short name, mean and amplitude of the synthetic fields
+SYNTHETIC_NOAA = {
+    "var_DIRPW=on": ("dirpw", 180.0, 180.0),
+    "var_HTSGW=on": ("swh", 2.0, 1.5),
+    "var_PERPW=on": ("perpw", 8.0, 4.0),
+    "var_UGRD=on": ("u", 2.0, 8.0),
+    "var_VGRD=on": ("v", -1.0, 8.0),
+    "var_WIND=on": ("ws", 8.0, 6.0),
+}
+
+
+class SyntheticSource(DataSource):
+    """
+    A class generating deterministic data shaped like the real sources (grids, time axes, variable names,
+    NaN over land) without credentials or network access, used to profile and load test PyThor offline.
+    Values only depend on the variable, time, coordinates and seed, every opened dataset and NOAA file
+    is delayed by the configured latency
+    """
+    name = "synthetic"
+
+    def __init__(self, latitude, longitude, past_days, forecast_days, latency, seed):
+        """
+        :param latitude: [start, end] of the generated grids
+        :param longitude: [start, end] of the generated grids
+        :param past_days: days of data before the current day
+        :param forecast_days: days of data after the current day
+        :param latency: seconds waited before returning a dataset or a NOAA file
+        :param seed: changes all generated values and the land mask
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.past_days = past_days
+        self.forecast_days = forecast_days
+        self.latency = latency
+        self.seed = seed
+
+    def cache_id(self, dataset_id) -> str:
+        return f"synthetic-{self.seed}-{dataset_id}"
+
+    def land(self, lat, lon) -> np.ndarray:
+        """
+        :return: True where the coordinates are over land
+        """
+        lat, lon = np.radians(lat), np.radians(lon)
+        return (np.sin(7 * lat + self.seed) * np.cos(5 * lon) + 0.5 * np.sin(13 * (lat + lon) + 2 * self.seed)) > 0.8
+
+    def field(self, variable, t, lat, lon, mean, amplitude) -> np.ndarray:
+        """
+        smooth field travelling with time, NaN over land
+        :param t: unix timestamps broadcastable with lat and lon
+        """
+        phase = sum(variable.encode()) % 17 + self.seed
+        days = t / 86400.0
+        r_lat, r_lon = np.radians(lat), np.radians(lon)
+        values = mean + amplitude * np.sin(9 * r_lat + 2 * np.pi * days + phase) * np.cos(6 * r_lon - np.pi * days)
+        return np.where(self.land(lat, lon), np.nan, values)
+
+    def axis(self, bounds, step) -> np.ndarray:
+        return np.arange(np.ceil(bounds[0] / step), np.floor(bounds[1] / step) + 1) * step
+
+    def dataset(self, dataset_id) -> xr.Dataset:
+        if dataset_id not in SYNTHETIC_DATASETS:
+            raise ValueError(f"dataset {dataset_id} is not available in the synthetic source")
+        time.sleep(self.latency)
+        spec = SYNTHETIC_DATASETS[dataset_id]
+        lat = self.axis(self.latitude, spec["step"])
+        lon = self.axis(self.longitude, spec["step"])
+        today = int(time.time()) // 86400 * 86400
+        t = np.arange(today - self.past_days * 86400, today + (self.forecast_days + 1) * 86400,
+                      spec["time_step"]) + spec["time_offset"]
+        dims = ("time", "depth", "latitude", "longitude") if spec["depth"] else ("time", "latitude", "longitude")
+        data_vars = {}
+        for name, (standard_name, mean, amplitude) in spec["variables"].items():
+            values = SyntheticArray(self, name, t, lat, lon, mean, amplitude, spec["depth"])
+            data_vars[name] = xr.Variable(dims, indexing.LazilyIndexedArray(values), {"standard_name": standard_name})
+        coords = {"time": t.astype("datetime64[s]").astype("datetime64[ns]"), "latitude": lat, "longitude": lon}
+        if spec["depth"]:
+            coords["depth"] = [0.494]
+        return xr.Dataset(data_vars, coords=coords)
+
+    def noaa_download(self, download):
+        time.sleep(self.latency)
+        return download
+
+    def noaa_decode(self, content) -> dict:
+        area = content["area"]
+        # GRIB grids are stored north to south on a 0.25 degree grid
+        lat = self.axis(area["latitude"], 0.25)[::-1]
+        lon = self.axis(area["longitude"], 0.25)
+        fields = {}
+        for v in content["variables"]:
+            if v in SYNTHETIC_NOAA:
+                short_name, mean, amplitude = SYNTHETIC_NOAA[v]
+                fields[short_name] = self.field(short_name, content["valid"], lat[:, None], lon[None, :], mean,
+                                                amplitude)
+        return {"latitude": lat, "longitude": lon, "time": content["valid"] - 3600 * content["lead"],
+                "fields": fields}
+
+
+class SyntheticArray(BackendArray):
+    """
+    A lazily indexed variable of a synthetic dataset, only the selected points are ever computed
+    """
+
+    def __init__(self, source, name, t, lat, lon, mean, amplitude, depth):
+        self.source = source
+        self.name = name
+        self.axes = [t, np.zeros(1), lat, lon] if depth else [t, lat, lon]
+        self.mean = mean
+        self.amplitude = amplitude
+        self.shape = tuple(len(axis) for axis in self.axes)
+        self.dtype = np.dtype(float)
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.OUTER, self._getitem)
+
+    def _getitem(self, key):
+        selected = [np.atleast_1d(axis[k]) for axis, k in zip(self.axes, key)]
+        t, lat, lon = selected[0], selected[-2], selected[-1]
+        values = self.source.field(self.name, t[:, None, None], lat[None, :, None], lon[None, None, :], self.mean,
+                                   self.amplitude)
+        if len(self.axes) == 4:
+            values = np.repeat(values[:, None], len(selected[1]), axis=1)
+        # integer keys drop their axis
+        return np.asarray(values[tuple(0 if isinstance(k, (int, np.integer)) else slice(None) for k in key)])
+
+
+def get_data_source(settings) -> DataSource:
+    """
+    create the data source selected in the config
+    :param settings: data_source section of the config
+    """
+    if settings["backend"] == "synthetic":
+        synthetic = settings["synthetic"]
+        return SyntheticSource(synthetic["latitude"], synthetic["longitude"], synthetic["past_days"],
+                               synthetic["forecast_days"], synthetic["latency"], synthetic["seed"])
+    return RemoteSource()
+
+
+data_source = get_data_source(config.settings["data_source"])
@@ -0,0 +1,385 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
+from scipy.special import xlogy
+
+ENGINES = ("thin_plate", "local_rbf", "bilinear", "nearest")
+
+# number of factorized systems / operators and target grids kept in memory
+SOLVER_CACHE_SIZE = 8
+TARGET_CACHE_SIZE = 4
+# most right hand sides solved together, the same blocks are solved whether the work is split between
+# worker processes or not, so the rounding and the result do not depend on the number of workers
+SLICE_BLOCK = 16
+
+_solver_cache = OrderedDict()
+_target_cache = OrderedDict()
+
+
+def spherical_to_cartesian(lat, lon, r=1):
+    """
+    return cartesian coordinates of given spherical coordinates
+    :param r:
+    :param lon: longitude of given point
+    :param lat: latitude of given point
+    :return: a tuple of three coordinates in cartesian system
+    """
+    lat_rad = np.deg2rad(lat)
+    lon_rad = np.deg2rad(lon)
+    x = r * np.cos(lat_rad) * np.cos(lon_rad)
+    y = r * np.cos(lat_rad) * np.sin(lon_rad)
+    z = r * np.sin(lat_rad)
+    return x, y, z
+
+
+def thin_plate_kernel(r):
+    """
+    thin plate radial basis function, the same kernel scipy Rbf uses for function='thin_plate'
+    :param r: distances
+    :return: kernel values
+    """
+    return xlogy(r ** 2, r)
+
+
+def _valid_points(lat_grid, lon_grid, valid):
+    x, y, z = spherical_to_cartesian(lat_grid[valid].ravel(), lon_grid[valid].ravel())
+    return np.column_stack((x, y, z))
+
+
+def _target_points(lat_inter_grid, lon_inter_grid):
+    key = _hash_arrays(lat_inter_grid, lon_inter_grid)
+    if key in _target_cache:
+        _target_cache.move_to_end(key)
+        return _target_cache[key]
+    x, y, z = spherical_to_cartesian(np.ravel(lat_inter_grid), np.ravel(lon_inter_grid))
+    target = np.column_stack((x, y, z))
+    _remember(_target_cache, key, target, TARGET_CACHE_SIZE)
+    return target
+
+
+def _hash_arrays(*arrays):
+    digest = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        digest.update(str(a.shape).encode())
+        digest.update(a.tobytes())
+    return digest.hexdigest()
+
+
+def _remember(cache, key, value, size):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+class ThinPlateSolver:
+    """
+    A class that keeps the LU factorization of the global thin plate RBF system of a fixed set of source points,
+    so the system can be solved for many right hand sides (time steps, variables) at once
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.factorization = lu_factor(thin_plate_kernel(cdist(source, source)))
+
+    def apply(self, values, target):
+        """
+        fit the RBF to every column of values and evaluate it at the target points
+        :param values: array of shape (source points, right hand sides)
+        :param target: cartesian target points of shape (target points, 3)
+        :return: array of shape (target points, right hand sides)
+        """
+        nodes = lu_solve(self.factorization, values)
+        return thin_plate_kernel(cdist(target, self.source)) @ nodes
+
+
+def nearest_operator(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours=None):
+    """
+    build a sparse operator assigning every target point the value of its closest valid source point
+    :return: sparse matrix of shape (target points, valid source points)
+    """
+    source = _valid_points(lat_grid, lon_grid, valid)
+    target = _target_points(lat_inter_grid, lon_inter_grid)
+    _, idx = cKDTree(source).query(target)
+    rows = np.arange(len(target))
+    return sparse.csr_matrix((np.ones(len(target)), (rows, idx)), shape=(len(target), len(source)))
+
+
+def local_rbf_operator(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours=16):
+    """
+    build a sparse operator fitting a thin plate RBF to the k nearest valid source points of every target point
+    :param neighbours: number of source points used for every target point
+    :return: sparse matrix of shape (target points, valid source points)
+    """
+    source = _valid_points(lat_grid, lon_grid, valid)
+    target = _target_points(lat_inter_grid, lon_inter_grid)
+    k = min(neighbours, len(source))
+    if k < 3:
+        return nearest_operator(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid)
+    distances, idx = cKDTree(source).query(target, k=k)
+    local = source[idx]
+    system = thin_plate_kernel(np.linalg.norm(local[:, :, None, :] - local[:, None, :, :], axis=-1))
+    weights = np.linalg.solve(system, thin_plate_kernel(distances)[..., None])[..., 0]
+    rows = np.repeat(np.arange(len(target)), k)
+    return sparse.csr_matrix((weights.ravel(), (rows, idx.ravel())), shape=(len(target), len(source)))
+
+
+def bilinear_operator(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours=None):
+    """
+    build a sparse operator interpolating bilinearly on the native source grid
+    corners without data are dropped and the remaining weights renormalized,
+    target points with no valid corner fall back to the nearest valid source point
+    :return: sparse matrix of shape (target points, valid source points)
+    """
+    lat, lon = lat_grid[:, 0], lon_grid[0, :]
+    target_lat, target_lon = np.ravel(lat_inter_grid), np.ravel(lon_inter_grid)
+    corners, weights = [], []
+    i, fy = _cell_position(lat, target_lat)
+    j, fx = _cell_position(lon, target_lon)
+    for di, wy in ((0, 1 - fy), (1, fy)):
+        for dj, wx in ((0, 1 - fx), (1, fx)):
+            ii, jj = np.minimum(i + di, len(lat) - 1), np.minimum(j + dj, len(lon) - 1)
+            corners.append(np.ravel_multi_index((ii, jj), valid.shape))
+            weights.append(wy * wx * valid[ii, jj])
+    corners, weights = np.stack(corners, axis=1), np.stack(weights, axis=1)
+    total = weights.sum(axis=1)
+    covered = total > 0
+    weights[covered] /= total[covered, None]
+
+    # map flat grid indices onto indices of valid points, invalid corners carry zero weight
+    valid_index = np.maximum(np.cumsum(valid.ravel()) - 1, 0)
+    rows = np.repeat(np.arange(len(target_lat)), 4)
+    operator = sparse.csr_matrix((weights.ravel(), (rows, valid_index[corners.ravel()])),
+                                 shape=(len(target_lat), int(valid.sum())))
+    operator.eliminate_zeros()
+    if not covered.all():
+        fallback = nearest_operator(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid)
+        operator = operator + sparse.diags((~covered).astype(float)) @ fallback
+    return operator
+
+
+def _cell_position(axis, points):
+    """
+    find the grid cell containing every point and the fractional position of the point inside it
+    :param axis: ascending source axis
+    :param points: coordinates to locate
+    :return: a tuple of lower cell indices and fractions clipped to [0, 1]
+    """
+    if len(axis) == 1:
+        return np.zeros(len(points), dtype=int), np.zeros(len(points))
+    idx = np.clip(np.searchsorted(axis, points) - 1, 0, len(axis) - 2)
+    fraction = np.clip((points - axis[idx]) / (axis[idx + 1] - axis[idx]), 0, 1)
+    return idx, fraction
+
+
+OPERATORS = {
+    "local_rbf": local_rbf_operator,
+    "bilinear": bilinear_operator,
+    "nearest": nearest_operator,
+}
+
+
+def get_solver(engine, lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours=16, store=None):
+    """
+    get a cached solver for the given source coordinates, valid point mask and engine,
+    building (factorizing) it on the first use
+    :param store: optional WeightsStore, when given the sparse operators of the local engines are persisted
+    on disk, so following requests for the same grids only do a sparse product
+    :return: a callable mapping values of shape (valid points, right hand sides) onto the target points
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown interpolation engine: {engine}")
+    if engine == "thin_plate":
+        # the thin plate operator is dense, only the factorization is kept, it does not depend on the target grid
+        store = None
+        key = (engine, _hash_arrays(lat_grid, lon_grid, valid))
+    else:
+        key = (engine, neighbours, _hash_arrays(lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid))
+    if key in _solver_cache:
+        _solver_cache.move_to_end(key)
+        solver = _solver_cache[key]
+    else:
+        store_key = hashlib.sha1(repr(key).encode()).hexdigest()
+        solver = store.load(store_key) if store is not None else None
+        if solver is None:
+            if engine == "thin_plate":
+                solver = ThinPlateSolver(_valid_points(lat_grid, lon_grid, valid))
+            else:
+                solver = OPERATORS[engine](lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours)
+            if store is not None:
+                store.save(store_key, solver)
+        _remember(_solver_cache, key, solver, SOLVER_CACHE_SIZE)
+
+    if isinstance(solver, ThinPlateSolver):
+        target = _target_points(lat_inter_grid, lon_inter_grid)
+        return lambda values: solver.apply(values, target)
+    return lambda values: solver @ values
+
+
+def spatial_interpolation(engine, slices, lat_grid, lon_grid, lat_inter_grid, lon_inter_grid, neighbours=16,
+                          store=None):
+    """
+    interpolate a stack of 2D slices onto the target grid with the chosen spatial engine
+    slices sharing the same NaN pattern are solved together as one multi right hand side operation
+    :param engine: one of ENGINES
+    :param slices: array of shape (slices, lat, lon), NaN where there is no data
+    :param neighbours: number of neighbours used by the local_rbf engine
+    :param store: optional WeightsStore persisting the operators on disk
+    :return: array of shape (slices, lat_inter, lon_inter)
+    """
+    slices = np.asarray(slices, dtype=float)
+    result = np.empty((len(slices),) + np.shape(lat_inter_grid))
+    for members in mask_groups(slices):
+        valid = ~np.isnan(slices[members[0]])
+        if not valid.any():
+            result[members] = np.nan
+            continue
+        solve = get_solver(engine, lat_grid, lon_grid, valid, lat_inter_grid, lon_inter_grid, neighbours, store)
+        values = slices[members][:, valid].T
+        result[members] = np.asarray(solve(values)).T.reshape((len(members),) + np.shape(lat_inter_grid))
+    return result
+
+
+def mask_groups(slices) -> list:
+    """
+    group slices by their NaN pattern
+    :param slices: array of shape (slices, lat, lon)
+    :return: list of index arrays, one for every distinct NaN pattern
+    """
+    nan_masks = np.isnan(slices).reshape(len(slices), -1)
+    _, group_of = np.unique(nan_masks, axis=0, return_inverse=True)
+    group_of = np.ravel(group_of)
+    return [np.flatnonzero(group_of == g) for g in range(group_of.max() + 1)] if len(slices) else []
+
+
+def estimate_memory(engine, n_source, n_target, n_slices, neighbours=16) -> int:
+    """
+    estimate the peak memory of interpolating n_slices slices with the given engine
+    :return: number of bytes
+    """
+    data = n_slices * (n_source + n_target)
+    if engine == "thin_plate":
+        # dense system matrix and evaluation matrix
+        return 8 * (n_source * n_source + n_target * n_source + data)
+    if engine == "local_rbf":
+        # batched local systems
+        return 8 * (2 * n_target * neighbours * neighbours + data)
+    return 8 * (8 * n_target + data)
+
+
+def plan_tiles(engine, lat, lon, lat_inter, lon_inter, n_slices, neighbours, memory_budget, halo):
+    """
+    split the output grid into the smallest number of tiles whose interpolation fits in the memory budget
+    :param lat: source latitude axis
+    :param lon: source longitude axis
+    :param memory_budget: memory budget in bytes
+    :param halo: margin of source points around every tile, in degrees
+    :return: a tuple of the number of tiles along latitude and longitude
+    """
+    def source_points(axis, target, tiles):
+        if len(axis) < 2 or len(target) < 2:
+            return len(axis)
+        extent = (target[-1] - target[0]) / tiles + 2 * halo
+        return min(len(axis), int(np.ceil(extent / abs(axis[1] - axis[0]))) + 1)
+
+    lat_tiles, lon_tiles = 1, 1
+    while True:
+        n_source = source_points(lat, lat_inter, lat_tiles) * source_points(lon, lon_inter, lon_tiles)
+        n_target = int(np.ceil(len(lat_inter) / lat_tiles)) * int(np.ceil(len(lon_inter) / lon_tiles))
+        if estimate_memory(engine, n_source, n_target, n_slices, neighbours) <= memory_budget or n_target <= 1:
+            return lat_tiles, lon_tiles
+        # a tile holds at least one row and one column of the output grid
+        if len(lat_inter) / lat_tiles >= len(lon_inter) / lon_tiles:
+            lat_tiles = min(lat_tiles * 2, len(lat_inter))
+        else:
+            lon_tiles = min(lon_tiles * 2, len(lon_inter))
+
+
+def plan_work(engine, slices, lat, lon, lat_inter, lon_inter, neighbours=16, memory_budget=2 ** 31, halo=0.5) -> list:
+    """
+    split the interpolation of a stack of 2D slices into independent pieces: the output grid is split into
+    the tiles fitting in the memory budget, the slices of every tile into blocks of at most SLICE_BLOCK slices
+    sharing their NaN pattern inside the source points of the tile
+    every tile is interpolated from the source points inside of it and a halo around it
+    :param slices: array of shape (slices, lat, lon), NaN where there is no data
+    :param lat: ascending source latitude axis
+    :param lon: ascending source longitude axis
+    :param memory_budget: memory budget in bytes
+    :param halo: margin of source points around every tile, in degrees
+    :return: list of tuples of the slice indices, source latitude and longitude indices and output latitude
+    and longitude indices of every piece
+    """
+    slices = np.asarray(slices, dtype=float)
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    lat_inter, lon_inter = np.asarray(lat_inter), np.asarray(lon_inter)
+    lat_tiles, lon_tiles = plan_tiles(engine, lat, lon, lat_inter, lon_inter, len(slices), neighbours,
+                                      memory_budget, halo)
+    if lat_tiles * lon_tiles > 1:
+        print(f"Interpolating in {lat_tiles * lon_tiles} tiles")
+    work = []
+    for lat_tile in np.array_split(np.arange(len(lat_inter)), lat_tiles):
+        if len(lat_tile) == 0:
+            continue
+        rows = np.arange(len(lat))
+        if lat_tiles * lon_tiles > 1:
+            rows = np.flatnonzero((lat >= lat_inter[lat_tile[0]] - halo) & (lat <= lat_inter[lat_tile[-1]] + halo))
+        for lon_tile in np.array_split(np.arange(len(lon_inter)), lon_tiles):
+            if len(lon_tile) == 0:
+                continue
+            cols = np.arange(len(lon))
+            if lat_tiles * lon_tiles > 1:
+                cols = np.flatnonzero((lon >= lon_inter[lon_tile[0]] - halo)
+                                      & (lon <= lon_inter[lon_tile[-1]] + halo))
+            for members in mask_groups(slices[np.ix_(np.arange(len(slices)), rows, cols)]):
+                for block in np.array_split(members, -(-len(members) // SLICE_BLOCK)):
+                    work.append((block, rows, cols, lat_tile, lon_tile))
+    return work
+
+
+def interpolate_piece(engine, slices, lat, lon, lat_inter, lon_inter, neighbours=16, store=None):
+    """
+    interpolate one piece of work planned by plan_work
+    :param slices: array of shape (slices, lat, lon) of the source points of the piece
+    :return: array of shape (slices, lat_inter, lon_inter)
+    """
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    lon_inter_grid, lat_inter_grid = np.meshgrid(lon_inter, lat_inter)
+    return spatial_interpolation(engine, slices, lat_grid, lon_grid, lat_inter_grid, lon_inter_grid, neighbours,
+                                 store)
+
+
+def interpolate_work(engine, slices, lat, lon, lat_inter, lon_inter, work, neighbours=16, store=None):
+    """
+    interpolate the pieces of work planned by plan_work one after another and stitch them
+    :return: array of shape (slices, lat_inter, lon_inter)
+    """
+    slices = np.asarray(slices, dtype=float)
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    lat_inter, lon_inter = np.asarray(lat_inter), np.asarray(lon_inter)
+    result = np.empty((len(slices), len(lat_inter), len(lon_inter)))
+    for members, rows, cols, lat_tile, lon_tile in work:
+        result[np.ix_(members, lat_tile, lon_tile)] = interpolate_piece(
+            engine, slices[np.ix_(members, rows, cols)], lat[rows], lon[cols], lat_inter[lat_tile],
+            lon_inter[lon_tile], neighbours, store)
+    return result
+
+
+def tiled_interpolation(engine, slices, lat, lon, lat_inter, lon_inter, neighbours=16, store=None,
+                        memory_budget=2 ** 31, halo=0.5):
+    """
+    interpolate a stack of 2D slices onto the output grid, splitting the output grid into tiles when
+    interpolating it at once would not fit in the memory budget, see plan_work
+    :param lat: ascending source latitude axis
+    :param lon: ascending source longitude axis
+    :param memory_budget: memory budget in bytes
+    :param halo: margin of source points around every tile, in degrees
+    :return: array of shape (slices, lat_inter, lon_inter)
+    """
+    work = plan_work(engine, slices, lat, lon, lat_inter, lon_inter, neighbours, memory_budget, halo)
+    return interpolate_work(engine, slices, lat, lon, lat_inter, lon_inter, work, neighbours, store)
@@ -0,0 +1,60 @@
+from scipy import sparse
+
+from PyThor.app_pythor import config
+from PyThor.config.config import weights_folder
+from PyThor.utilities.files import atomic_write, evict_lru, mark_used
+
+
+class WeightsStore:
+    """
+    A class that persists precomputed regridding weights (sparse operators mapping the valid points of a source grid
+    onto the PyThor output grid) on disk, bounded in size with least recently used eviction
+    """
+
+    def __init__(self, folder, max_size_mb):
+        self.folder = folder
+        self.max_size = int(max_size_mb * 1024 * 1024)
+
+    def __path(self, key):
+        return self.folder / (key + ".npz")
+
+    def load(self, key):
+        """
+        load the operator stored under the key
+        :param key: hash of the source grid, valid point mask, output grid and engine
+        :return: sparse matrix or None if the weights were not computed yet
+        """
+        path = self.__path(key)
+        try:
+            operator = sparse.load_npz(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        mark_used(path)
+        return operator
+
+    def save(self, key, operator):
+        """
+        atomically store the operator under the key and evict old entries above the size limit
+        :param key: hash of the source grid, valid point mask, output grid and engine
+        :param operator: sparse matrix of shape (output points, valid source points)
+        """
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                sparse.save_npz(f, sparse.csr_matrix(operator))
+
+        try:
+            atomic_write(self.__path(key), write)
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        delete least recently used weights until the store fits in its size limit
+        """
+        evict_lru(self.folder, ".npz", self.max_size)
+
+
+weights_store = None
+if config.settings["weights_cache"]["active"]:
+    weights_store = WeightsStore(weights_folder, config.settings["weights_cache"]["max_size_mb"])
@@ -1,10 +1,26 @@
 import os
-from PyThor.config.config import save_folder, cache_folder
+import tempfile
+import time
+
+from PyThor.config.config import save_folder, cache_folder, weights_folder, masks_folder, raw_folder, jobs_folder
+
+# suffix of the files being written, they replace their target once complete
+TMP_SUFFIX = ".tmp"
+# seconds after which a temporary file is left over by a crashed writer
+TMP_MAX_AGE = 3600
 
 if not save_folder.exists():
     os.mkdir(save_folder)
 if not cache_folder.exists():
     os.mkdir(cache_folder)
+if not weights_folder.exists():
+    os.mkdir(weights_folder)
+if not masks_folder.exists():
+    os.mkdir(masks_folder)
+if not raw_folder.exists():
+    os.mkdir(raw_folder)
+if not jobs_folder.exists():
+    os.mkdir(jobs_folder)
 
 
 def rm_grib_files():
@@ -14,7 +30,7 @@ def rm_grib_files():
     try:
         files = os.listdir(save_folder)
         for f in files:
-            os.remove(save_folder + f)
+            os.remove(save_folder / f)
         os.rmdir(save_folder)
     except FileNotFoundError:
         return
@@ -27,7 +43,72 @@ def rm_cache_files():
     try:
         files = os.listdir(cache_folder)
         for f in files:
-            os.remove(cache_folder + f)
+            os.remove(cache_folder / f)
         os.rmdir(cache_folder)
     except FileNotFoundError:
         return
+
+
+def atomic_write(path, writer):
+    """
+    write a file atomically: the content is written to a temporary file in the same folder,
+    which then replaces the file, so readers never see a partially written file
+    :param path: Path of the file
+    :param writer: function writing the content to the path of the temporary file it is called with
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=TMP_SUFFIX)
+    os.close(fd)
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def mark_used(path):
+    """
+    bump the modification time of a cached file, eviction removes the least recently used files first
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_lru(folder, suffix, max_bytes):
+    """
+    delete the least recently used files with the suffix until they fit in max_bytes,
+    temporary files left over by crashed writers are deleted as well
+    :param folder: Path of the folder
+    :param suffix: suffix of the evicted files
+    :param max_bytes: size limit of the files in bytes
+    """
+    entries = []
+    now = time.time()
+    for f in os.listdir(folder):
+        if not f.endswith(suffix) and not f.endswith(TMP_SUFFIX):
+            continue
+        try:
+            stat = os.stat(folder / f)
+        except FileNotFoundError:
+            continue
+        if f.endswith(suffix):
+            entries.append((stat.st_mtime, stat.st_size, f))
+        elif now - stat.st_mtime > TMP_MAX_AGE:
+            try:
+                os.remove(folder / f)
+            except OSError:
+                pass
+    total = sum(e[1] for e in entries)
+    for _, size, f in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(folder / f)
+        except OSError:
+            pass
+        total -= size
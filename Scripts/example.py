@@ -7,4 +7,5 @@ config.override({"coppernicus_acount": {
     "resolution": 0.15,
     "land_treshhold": 0.2,
     "clear_cache": True})
-runPythor(host='localhost', port=8080)
+if __name__ == "__main__":
+    runPythor(host='localhost', port=8080)
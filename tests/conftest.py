@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+
+import PyThor.app_pythor as app_pythor
+import PyThor.data.fetcher as fetcher
+import PyThor.data.interpolation as interpolation
+import PyThor.data.sources as sources
+from PyThor.app_pythor import config
+from PyThor.data.coverage import CoverageIndex
+from PyThor.data.land_mask import LandMaskCache
+from PyThor.data.raw_cache import RawDataCache
+from PyThor.data.result_cache import ResultCache
+from PyThor.data.single_flight import SingleFlight
+from PyThor.data.sources import SyntheticSource
+from PyThor.data.weights import WeightsStore
+
+TIDE = "cmems_mod_glo_phy_anfc_0.083deg_PT1H-m"
+CURRENTS = "cmems_mod_glo_phy-cur_anfc_0.083deg_PT6H-i"
+WIND = "cmems_obs-wind_glo_phy_nrt_l4_0.125deg_PT1H"
+
+
+class CountingSource(SyntheticSource):
+    """
+    synthetic source counting the time steps of every field it computes
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.steps = []
+
+    def field(self, variable, t, *args):
+        self.steps.append(np.size(t))
+        return super().field(variable, t, *args)
+
+
+def make_source(cls=SyntheticSource, latency=0.0):
+    return cls([30.0, 45.0], [5.0, 25.0], 2, 3, latency, 0)
+
+
+def use_source(monkeypatch, source):
+    """
+    make the fetcher and the interpolation read from the given source
+    """
+    monkeypatch.setattr(sources, "data_source", source)
+    monkeypatch.setattr(fetcher, "data_source", source)
+    monkeypatch.setattr(interpolation, "data_source", source)
+    return source
+
+
+def query(variables, hours=6, offset=0, latitude=(36, 37), longitude=(15, 16)) -> str:
+    """
+    :return: query string of a request starting offset seconds after the current hour
+    """
+    start = int(time.time()) // 3600 * 3600 + offset
+    return (f"latitude_start={latitude[0]}&latitude_end={latitude[1]}&longitude_start={longitude[0]}"
+            f"&longitude_end={longitude[1]}&variables={variables}&time_start={start}&time_end={start + hours * 3600}")
+
+
+@pytest.fixture
+def synthetic(monkeypatch, tmp_path):
+    """
+    serve requests from the synthetic source with every cache stored in a temporary folder,
+    the raw data cache is disabled
+    :return: the synthetic source
+    """
+    monkeypatch.setitem(config.settings["data_source"], "backend", "synthetic")
+    monkeypatch.setitem(config.settings, "noaa_active", True)
+    for name in ("Cache", "Raw", "Weights", "Masks"):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(fetcher, "raw_cache", None)
+    monkeypatch.setattr(interpolation, "weights_store", WeightsStore(tmp_path / "Weights", 64))
+    monkeypatch.setattr(interpolation, "land_masks", LandMaskCache(tmp_path / "Masks", 16, 4))
+    results = ResultCache(tmp_path / "Cache", 64, 16, 6, 4)
+    monkeypatch.setattr(app_pythor, "result_cache", results)
+    monkeypatch.setattr(app_pythor, "coverage_index", CoverageIndex(results, 30))
+    monkeypatch.setattr(app_pythor, "single_flight", SingleFlight(tmp_path / "Cache", 64, 60))
+    return use_source(monkeypatch, make_source())
+
+
+@pytest.fixture
+def raw_cache(synthetic, monkeypatch, tmp_path):
+    """
+    enable the raw data cache of the synthetic source
+    """
+    cache = RawDataCache(tmp_path / "Raw", 256, 1.0, 24, 6, 4)
+    monkeypatch.setattr(fetcher, "raw_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def client(synthetic):
+    return app_pythor.app.test_client()
@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import PyThor.data.copernicus as copernicus
+from PyThor.data.copernicus import CopernicusSession
+from tests.conftest import TIDE, CURRENTS, make_source
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """
+    open synthetic datasets in place of the copernicus toolbox
+    :return: list of the dataset ids opened
+    """
+    source = make_source()
+    calls = []
+    lock = threading.Lock()
+
+    def open_dataset(dataset_id, username, password):
+        with lock:
+            calls.append(dataset_id)
+        time.sleep(0.05)
+        return source.dataset(dataset_id)
+
+    monkeypatch.setattr(copernicus.copernicusmarine, "open_dataset", open_dataset)
+    return calls
+
+
+def test_dataset_is_opened_once_for_concurrent_requests(opened):
+    session = CopernicusSession("user", "password", 60)
+    with ThreadPoolExecutor(8) as executor:
+        datasets = list(executor.map(lambda _: session.dataset(TIDE), range(8)))
+
+    assert opened == [TIDE]
+    assert all(d is datasets[0] for d in datasets)
+
+
+def test_metadata_is_cached_until_the_ttl(opened):
+    session = CopernicusSession("user", "password", 0.3)
+    metadata = session.metadata(TIDE)
+    session.metadata(TIDE)
+    session.metadata(CURRENTS)
+    assert opened == [TIDE, CURRENTS]
+
+    time.sleep(0.4)
+    session.metadata(TIDE)
+    assert opened == [TIDE, CURRENTS, TIDE]
+    assert metadata["variables"] == {"zos": "sea_surface_height_above_geoid"}
+    assert np.issubdtype(metadata["time"].dtype, np.datetime64)
+
+
+def test_invalidated_dataset_is_reopened(opened):
+    session = CopernicusSession("user", "password", 60)
+    session.dataset(TIDE)
+    session.dataset(CURRENTS)
+    session.invalidate(TIDE)
+    session.dataset(TIDE)
+    session.dataset(CURRENTS)
+    session.invalidate()
+    session.dataset(CURRENTS)
+
+    assert opened == [TIDE, CURRENTS, TIDE, CURRENTS]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import PyThor.app_pythor as app_pythor
+from PyThor.app_pythor import config
+from PyThor.data.coverage import CoverageIndex
+from PyThor.data.result_cache import ResultCache
+from tests.conftest import query
+
+SERVED = "Served from a cached result covering the request"
+
+
+@pytest.fixture
+def bilinear(synthetic, monkeypatch):
+    # a local engine interpolates a point from the same source points whatever area is requested
+    monkeypatch.setitem(config.settings["interpolation"], "engine", "bilinear")
+
+
+def use_results(monkeypatch, folder):
+    """
+    answer the following requests from an empty result cache in the given folder
+    """
+    folder.mkdir()
+    results = ResultCache(folder, 64, 16, 6, 4)
+    monkeypatch.setattr(app_pythor, "result_cache", results)
+    monkeypatch.setattr(app_pythor, "coverage_index", CoverageIndex(results, 30))
+
+
+def get(client, capsys, **area):
+    response = client.get("/api/weather?" + query("tide_height", **area))
+    assert response.status_code == 200
+    return response.get_json(), SERVED in capsys.readouterr().out
+
+
+def test_sliced_result_equals_direct_computation(bilinear, client, capsys, monkeypatch, tmp_path):
+    inner = {"latitude": (36.75, 37), "longitude": (15.75, 16)}
+    use_results(monkeypatch, tmp_path / "Direct")
+    direct, _ = get(client, capsys, **inner)
+    use_results(monkeypatch, tmp_path / "Sliced")
+    get(client, capsys)
+    sliced, served = get(client, capsys, **inner)
+
+    assert served
+    for name in ("time_inter", "lat_inter", "lon_inter"):
+        assert np.allclose(sliced[name], direct[name], rtol=0, atol=1e-9)
+    assert np.allclose(np.array(sliced["tide_height"], dtype=float), np.array(direct["tide_height"], dtype=float),
+                       equal_nan=True)
+
+
+def test_misaligned_grid_is_computed(bilinear, client, capsys):
+    get(client, capsys)
+    # the first source point inside the area is not on the cached output grid
+    inner, served = get(client, capsys, latitude=(36.05, 37), longitude=(15.05, 16))
+
+    assert not served
+    assert inner["lat_inter"][0] == pytest.approx(36 + 1 / 12)
+    assert inner["lon_inter"][0] == pytest.approx(15 + 1 / 12)
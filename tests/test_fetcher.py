@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pytest
+
+from PyThor.app_pythor import config
+from PyThor.data import fetcher
+from PyThor.data.data_request import DataRequest
+from PyThor.data.fetcher import Fetcher, FetchTimeoutError
+from PyThor.data.sources import SyntheticSource
+from tests.conftest import TIDE, CURRENTS, WIND, CountingSource, make_source, use_source, query
+
+VARIABLES = ["tide_height", "sea_current_speed", "wind_speed"]
+
+
+class CopernicusStandIn(SyntheticSource):
+    """
+    synthetic copernicus datasets opened with a delay or an error per dataset,
+    counting how many are opened at the same time
+    """
+    delays = {}
+    errors = {}
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def dataset(self, dataset_id):
+        if dataset_id in self.errors:
+            raise self.errors[dataset_id]
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays.get(dataset_id, 0.0))
+            return super().dataset(dataset_id)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def stand_in(synthetic, monkeypatch):
+    monkeypatch.setitem(config.settings, "noaa_active", False)
+    source = use_source(monkeypatch, make_source(CopernicusStandIn))
+    monkeypatch.setattr(source, "delays", {})
+    monkeypatch.setattr(source, "errors", {})
+    return source
+
+
+def request() -> DataRequest:
+    start = int(time.time()) // 3600 * 3600
+    return DataRequest(36, 37, 15, 16, start, start + 6 * 3600, 60, VARIABLES)
+
+
+def test_sources_are_fetched_concurrently(stand_in):
+    stand_in.delays = {TIDE: 0.3, CURRENTS: 0.3, WIND: 0.3}
+    started = time.monotonic()
+    result = Fetcher(request()).fetch()
+    elapsed = time.monotonic() - started
+
+    assert result["errors"] == {}
+    assert sorted(result["copernicus"]) == ["currents", "tides", "wind"]
+    assert stand_in.max_active == 3
+    # every source opens its dataset twice (metadata and data), one after the other
+    assert elapsed < 2 * 3 * 0.3
+
+
+def test_slow_source_times_out_without_the_others(stand_in, monkeypatch):
+    monkeypatch.setitem(config.settings["fetching"], "timeout", 0.5)
+    stand_in.delays = {TIDE: 1.5}
+    started = time.monotonic()
+    result = Fetcher(request()).fetch()
+
+    assert time.monotonic() - started < 1.2
+    assert result["errors"] == {"tides": "timeout"}
+    assert sorted(result["copernicus"]) == ["currents", "wind"]
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """
+    a fetch pool keeping the futures of the submitted sources
+    """
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.futures = []
+
+    def submit(self, *args, **kwargs):
+        future = super().submit(*args, **kwargs)
+        self.futures.append(future)
+        return future
+
+
+def test_timeout_counts_from_the_start_of_each_source(stand_in, monkeypatch):
+    executor = RecordingExecutor(1)
+    monkeypatch.setattr(fetcher, "fetch_executor", executor)
+    monkeypatch.setitem(config.settings["fetching"], "timeout", 1.0)
+    # with a single fetch thread the sources run one after the other, longer than the timeout in total
+    stand_in.delays = {TIDE: 0.2, CURRENTS: 0.2, WIND: 0.2}
+    result = Fetcher(request()).fetch()
+    executor.shutdown()
+
+    assert result["errors"] == {}
+    assert sorted(result["copernicus"]) == ["currents", "tides", "wind"]
+
+
+def test_timed_out_source_stops_before_loading(stand_in, monkeypatch):
+    executor = RecordingExecutor(3)
+    monkeypatch.setattr(fetcher, "fetch_executor", executor)
+    monkeypatch.setitem(config.settings["fetching"], "timeout", 0.3)
+    stand_in.delays = {TIDE: 0.4}
+    result = Fetcher(request()).fetch()
+    wait(executor.futures)
+    executor.shutdown()
+
+    assert result["errors"] == {"tides": "timeout"}
+    assert sum(isinstance(f.exception(), FetchTimeoutError) for f in executor.futures) == 1
+
+
+def test_failing_source_is_isolated(stand_in):
+    stand_in.errors = {CURRENTS: ConnectionError("copernicus unavailable")}
+    result = Fetcher(request()).fetch()
+
+    assert result["errors"] == {"currents": "copernicus unavailable"}
+    assert sorted(result["copernicus"]) == ["tides", "wind"]
+    assert result["copernicus"]["tides"].dataset.sizes["time"] > 0
+
+
+def test_failing_source_still_answers_the_request(stand_in, client):
+    stand_in.errors = {WIND: ConnectionError("copernicus unavailable")}
+    response = client.get("/api/weather?" + query(",".join(VARIABLES)))
+
+    assert response.status_code == 200
+    assert "tide_height" in response.get_json()
+
+
+@pytest.fixture
+def counting(synthetic, monkeypatch):
+    monkeypatch.setitem(config.settings, "noaa_active", False)
+    return use_source(monkeypatch, make_source(CountingSource))
+
+
+def test_tide_is_subset_to_the_bracketing_steps_before_loading(counting):
+    data_request = request()
+    start = int(data_request.get_output_times()[0])
+    tide = Fetcher(data_request).fetch_tide()
+    halo = config.settings["fetching"]["halo"]
+
+    # hourly samples at half past the hour around each of the six output times
+    assert np.array_equal(tide["time"].values.astype("datetime64[s]").astype("int64"),
+                          start - 1800 + 3600 * np.arange(7))
+    assert 36 - halo <= tide["latitude"].values[0] <= 36 and 37 <= tide["latitude"].values[-1] <= 37 + halo
+    assert counting.steps == []
+    tide.load()
+    assert counting.steps == [7]
+
+
+def test_currents_are_subset_to_whole_steps(counting):
+    data_request = request()
+    output_times = data_request.get_output_times()
+    currents = Fetcher(data_request).fetch_currents()
+
+    times = currents["time"].values.astype("datetime64[s]").astype("int64")
+    assert times[0] <= output_times[0] and output_times[-1] <= times[-1]
+    assert np.all(np.diff(times) == 6 * 3600) and len(times) <= 3
+    assert counting.steps == []
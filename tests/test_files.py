@@ -0,0 +1,41 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from PyThor.utilities.files import atomic_write, evict_lru, TMP_MAX_AGE
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = tmp_path / "a.result"
+    path.write_bytes(b"old")
+
+    def fail(tmp):
+        with open(tmp, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        atomic_write(path, fail)
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["a.result"]
+
+    atomic_write(path, lambda tmp: Path(tmp).write_bytes(b"new"))
+    assert path.read_bytes() == b"new"
+    assert os.listdir(tmp_path) == ["a.result"]
+
+
+def test_evict_lru_removes_least_recently_used_and_orphans(tmp_path):
+    now = time.time()
+    for age, name in enumerate(["new.npz", "used.npz", "old.npz"]):
+        (tmp_path / name).write_bytes(b"x" * 100)
+        os.utime(tmp_path / name, (now - 10 * age, now - 10 * age))
+    (tmp_path / "other.nc").write_bytes(b"x" * 1000)
+    (tmp_path / "crashed.tmp").write_bytes(b"x")
+    os.utime(tmp_path / "crashed.tmp", (now - TMP_MAX_AGE - 1, now - TMP_MAX_AGE - 1))
+    (tmp_path / "writing.tmp").write_bytes(b"x")
+
+    evict_lru(tmp_path, ".npz", 250)
+
+    assert sorted(os.listdir(tmp_path)) == ["new.npz", "other.nc", "used.npz", "writing.tmp"]
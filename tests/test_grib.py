@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import PyThor.data.grib as grib
+from PyThor.data.grib import decode_grib, split_messages
+
+eccodes = pytest.importorskip("eccodes")
+
+VALUES = np.arange(20.0).reshape(4, 5) / 10
+
+
+def message(short_name, values) -> bytes:
+    """
+    :return: GRIB2 message of a wave field on a 4 x 5 grid stored north to south, 9999 marks missing values
+    """
+    handle = eccodes.codes_grib_new_from_samples("regular_ll_sfc_grib2")
+    try:
+        eccodes.codes_set(handle, "discipline", 10)
+        eccodes.codes_set(handle, "shortName", short_name)
+        eccodes.codes_set_long(handle, "Ni", 5)
+        eccodes.codes_set_long(handle, "Nj", 4)
+        eccodes.codes_set(handle, "latitudeOfFirstGridPointInDegrees", 37.0)
+        eccodes.codes_set(handle, "latitudeOfLastGridPointInDegrees", 36.25)
+        eccodes.codes_set(handle, "longitudeOfFirstGridPointInDegrees", 15.0)
+        eccodes.codes_set(handle, "longitudeOfLastGridPointInDegrees", 16.0)
+        eccodes.codes_set(handle, "iDirectionIncrementInDegrees", 0.25)
+        eccodes.codes_set(handle, "jDirectionIncrementInDegrees", 0.25)
+        eccodes.codes_set(handle, "dataDate", 20260101)
+        eccodes.codes_set(handle, "dataTime", 600)
+        eccodes.codes_set(handle, "bitmapPresent", 1)
+        eccodes.codes_set_values(handle, values.ravel())
+        return eccodes.codes_get_message(handle)
+    finally:
+        eccodes.codes_release(handle)
+
+
+def grib_file() -> bytes:
+    gap = VALUES.copy()
+    gap[1, 2] = 9999
+    return message("swh", VALUES) + message("perpw", gap)
+
+
+def test_file_is_split_into_messages():
+    data = grib_file()
+    messages = split_messages(b"\0" * 8 + data)
+
+    assert len(messages) == 2
+    assert b"".join(messages) == data
+
+
+def test_file_is_decoded_in_memory():
+    res = decode_grib(grib_file())
+
+    assert np.allclose(res["latitude"], [37.0, 36.75, 36.5, 36.25])
+    assert np.allclose(res["longitude"], [15.0, 15.25, 15.5, 15.75, 16.0])
+    assert res["time"] == int(np.datetime64("2026-01-01T06:00", "s").astype("int64"))
+    assert sorted(res["fields"]) == ["perpw", "swh"]
+    assert np.allclose(res["fields"]["swh"], VALUES, atol=1e-6)
+    assert np.isnan(res["fields"]["perpw"][1, 2])
+    assert np.isnan(res["fields"]["perpw"]).sum() == 1
+
+
+def test_cfgrib_fallback_decodes_the_same(monkeypatch, tmp_path):
+    pytest.importorskip("cfgrib")
+    data = grib_file()
+    direct = decode_grib(data)
+    monkeypatch.setattr(grib, "eccodes", None)
+    monkeypatch.setattr(grib, "save_folder", tmp_path)
+    res = decode_grib(data)
+
+    assert res["time"] == direct["time"]
+    assert np.allclose(res["latitude"], direct["latitude"])
+    assert np.allclose(res["longitude"], direct["longitude"])
+    assert sorted(res["fields"]) == sorted(direct["fields"])
+    for name, values in direct["fields"].items():
+        assert np.allclose(res["fields"][name], values, equal_nan=True)
+    assert list(tmp_path.iterdir()) == []
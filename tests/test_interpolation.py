@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+import pytest
+
+from PyThor.app_pythor import config
+from PyThor.data.data_request import DataRequest
+from PyThor.data.fetcher import Fetcher
+from PyThor.data.interpolation import interpolate, time_interpolation, output_axis, bracketing_steps
+from tests.conftest import query
+
+VARIABLES = ["tide_height", "sea_current_speed", "sea_current_direction", "wind_speed", "wind_direction",
+             "wave_height", "wave_direction", "wave_period"]
+
+
+def serial_and_pooled(monkeypatch, request, start):
+    result = Fetcher(request).fetch()
+    assert not result["errors"]
+    outputs = []
+    for max_workers in (1, 3):
+        monkeypatch.setitem(config.settings["interpolation"], "max_workers", max_workers)
+        outputs.append(interpolate(result, request, [start, start + 12 * 3600]))
+    return outputs
+
+
+@pytest.mark.parametrize("engine", ["thin_plate", "local_rbf", "bilinear", "nearest"])
+def test_process_pool_matches_serial(synthetic, monkeypatch, engine):
+    start = int(time.time()) // 3600 * 3600
+    request = DataRequest(36, 37.5, 14.5, 16.5, start, start + 12 * 3600, 30, VARIABLES)
+    monkeypatch.setitem(config.settings["interpolation"], "engine", engine)
+    serial, parallel = serial_and_pooled(monkeypatch, request, start)
+
+    assert sorted(serial) == sorted(parallel)
+    for key in serial:
+        # bit identical, NaN over land included
+        assert np.array_equal(np.asarray(serial[key]), np.asarray(parallel[key]), equal_nan=True), key
+    assert np.isfinite(np.asarray(serial["tide_height"], dtype=float)).any()
+
+
+def test_tiled_process_pool_matches_serial(synthetic, monkeypatch, capsys):
+    start = int(time.time()) // 3600 * 3600
+    request = DataRequest(35.5, 38.5, 14, 17.5, start, start + 12 * 3600, 60, VARIABLES)
+    monkeypatch.setitem(config.settings["interpolation"], "engine", "thin_plate")
+    monkeypatch.setitem(config.settings["interpolation"], "memory_budget_mb", 1)
+    serial, parallel = serial_and_pooled(monkeypatch, request, start)
+
+    tiles = [line for line in capsys.readouterr().out.splitlines() if line.startswith("Interpolating in")]
+    # the four sources are tiled, the same way in both runs
+    assert len(tiles) == 8 and tiles[:4] == tiles[4:]
+    for key in serial:
+        assert np.array_equal(np.asarray(serial[key]), np.asarray(parallel[key]), equal_nan=True), key
+
+
+def test_time_interpolation_blends_neighbouring_steps():
+    time = np.array([0, 3600, 7200])
+    res = np.stack([np.full((2, 3), 1.0), np.full((2, 3), 3.0), np.full((2, 3), 7.0)])
+    res[1, 0, 0] = np.nan
+    weather = {}
+    time_interpolation(time, np.arange(2), np.arange(3), res, "zos", np.array([-60, 0, 1800, 3600, 5400, 7200,
+                                                                                  7260]), weather)
+
+    out = weather["zos"]
+    assert out.shape == (7, 2, 3)
+    assert np.isnan(out[[0, 6]]).all()
+    assert np.array_equal(out[1:6, 1, 1], [1.0, 2.0, 3.0, 5.0, 7.0])
+    # a missing value only affects the output times it contributes to
+    assert np.array_equal(np.isnan(out[1:6, 0, 0]), [False, True, True, True, False])
+
+
+def test_bracketing_steps_keep_the_interval_of_every_requested_time():
+    time = np.arange(10) * 3600
+
+    assert np.array_equal(bracketing_steps(time, [5400]), [1, 2])
+    assert np.array_equal(bracketing_steps(time, [7200]), [1, 2])
+    assert np.array_equal(bracketing_steps(time, [1800, 9000, 9900]), [0, 1, 2, 3])
+    # times outside the source axis keep the first or last interval
+    assert np.array_equal(bracketing_steps(time, [-60, 40000]), [0, 1, 8, 9])
+    assert np.array_equal(bracketing_steps(time[:1], [0]), [0])
+
+
+def test_bracketing_steps_give_the_same_time_interpolation():
+    time = np.arange(12) * 3600
+    res = np.random.default_rng(0).random((12, 2, 3))
+    time_inter = np.arange(5400, 20000, 1200)
+    every, selected = {}, {}
+    time_interpolation(time, np.arange(2), np.arange(3), res, "zos", time_inter, every)
+    steps = bracketing_steps(time, time_inter)
+    time_interpolation(time[steps], np.arange(2), np.arange(3), res[steps], "zos", time_inter, selected)
+
+    assert np.array_equal(steps, np.arange(1, 7))
+    assert np.array_equal(every["zos"], selected["zos"])
+
+
+def test_output_axis_is_never_empty():
+    axis = np.arange(140, 160) / 10
+    assert np.allclose(output_axis(axis, [14.2, 14.7], 0.15), [14.2, 14.35, 14.5, 14.65])
+    assert np.array_equal(output_axis(axis, [14.95, 15.05], 0.15), [15.0])
+    assert np.array_equal(output_axis(axis, [15.01, 15.03], 0.15), [15.02])
+
+
+@pytest.mark.parametrize("variables", ["tide_height,sea_current_speed", "wind_speed", "wave_height"])
+def test_area_narrower_than_the_source_grid(client, variables):
+    response = client.get("/api/weather?" + query(variables, longitude=(15.01, 15.03)))
+
+    assert response.status_code == 200
+    weather = response.get_json()
+    assert weather["lon_inter"] == [15.02]
+    for variable in variables.split(","):
+        assert np.shape(weather[variable]) == (6, len(weather["lat_inter"]), 1)
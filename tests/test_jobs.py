@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+
+import PyThor.app_pythor as app_pythor
+from PyThor.data.jobs import JobQueue
+from tests.conftest import query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Compute:
+    """
+    stand-in for app_pythor.compute going through the fetching, interpolating and serializing stages,
+    every stage waits until it is allowed to continue
+    """
+
+    def __init__(self, result=b'{"tide_height": []}'):
+        self.result = result
+        self.go = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+
+    def __call__(self, data_request, time, progress):
+        self.calls += 1
+        for stage in ("fetching", "interpolating", "serializing"):
+            progress(stage)
+            self.started.set()
+            self.go.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_queue(tmp_path, compute, clock, max_workers=1, max_jobs=4):
+    return JobQueue(tmp_path, compute, max_workers, max_jobs, 60, clock)
+
+
+def wait_for(queue, job_id, states=("done", "failed", "cancelled")):
+    for _ in range(500):
+        job = queue.status(job_id)
+        if job["state"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stayed {job['state']}")
+
+
+def test_job_lifecycle(tmp_path, clock):
+    compute = Compute()
+    queue = make_queue(tmp_path, compute, clock)
+    job = queue.submit("request", [0, 3600])
+    assert job["state"] == "queued" and job["created"] == 1000.0
+
+    compute.started.wait(5)
+    assert wait_for(queue, job["id"], ("running",))["stage"] == "fetching"
+    assert queue.result(job["id"]) is None
+    clock.now = 1010.0
+    compute.go.set()
+    job = wait_for(queue, job["id"])
+
+    assert job["state"] == "done" and job["stage"] is None
+    assert job["started"] == 1000.0 and job["finished"] == 1010.0
+    assert queue.result(job["id"]) == compute.result
+
+
+@pytest.mark.parametrize("result, error", [(None, "no data available"), (ValueError("bad area"), "bad area")])
+def test_failed_job_reports_the_error(tmp_path, clock, result, error):
+    compute = Compute(result)
+    compute.go.set()
+    queue = make_queue(tmp_path, compute, clock)
+    job = wait_for(queue, queue.submit("request", [0, 3600])["id"])
+
+    assert job["state"] == "failed" and job["error"] == error
+    assert queue.result(job["id"]) is None
+
+
+def test_cancelled_queued_job_never_runs(tmp_path, clock):
+    compute = Compute()
+    queue = make_queue(tmp_path, compute, clock)
+    running = queue.submit("request", [0, 3600])
+    queued = queue.submit("request", [0, 3600])
+    compute.started.wait(5)
+
+    assert queue.cancel(queued["id"])["state"] == "cancelled"
+    compute.go.set()
+    assert wait_for(queue, running["id"])["state"] == "done"
+    queue.executor.shutdown(wait=True)
+    assert compute.calls == 1
+    assert queue.status(queued["id"])["state"] == "cancelled"
+
+
+def test_cancelled_running_job_stops_at_the_next_stage(tmp_path, clock):
+    compute = Compute()
+    queue = make_queue(tmp_path, compute, clock)
+    job = queue.submit("request", [0, 3600])
+    compute.started.wait(5)
+    assert queue.cancel(job["id"])["state"] == "cancelled"
+    compute.go.set()
+    queue.executor.shutdown(wait=True)
+
+    job = queue.status(job["id"])
+    assert job["state"] == "cancelled" and job["stage"] is None
+    assert queue.result(job["id"]) is None
+    # finished jobs can not be cancelled again
+    assert queue.cancel(job["id"]) == job
+
+
+def test_too_many_jobs_are_rejected(tmp_path, clock):
+    compute = Compute()
+    queue = make_queue(tmp_path, compute, clock, max_jobs=2)
+    jobs = [queue.submit("request", [0, 3600]) for _ in range(3)]
+    compute.go.set()
+
+    assert jobs[2] is None
+    for job in jobs[:2]:
+        wait_for(queue, job["id"])
+    assert queue.submit("request", [0, 3600]) is not None
+
+
+def test_finished_jobs_expire_after_the_ttl(tmp_path, clock):
+    compute = Compute()
+    compute.go.set()
+    queue = make_queue(tmp_path, compute, clock)
+    job = wait_for(queue, queue.submit("request", [0, 3600])["id"])
+
+    clock.now += 59
+    queue.expire()
+    assert queue.result(job["id"]) == compute.result
+    clock.now += 1
+    queue.expire()
+    assert queue.status(job["id"]) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_job_ids_are_not_found(tmp_path, clock):
+    queue = make_queue(tmp_path, Compute(), clock)
+
+    assert queue.status("../config") is None
+    assert queue.cancel("0" * 32) is None
+
+
+def test_job_api_returns_the_weather_result(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_pythor, "job_queue", JobQueue(tmp_path, app_pythor.compute, 1, 4, 60))
+    submitted = client.post("/api/jobs?" + query("tide_height"))
+    assert submitted.status_code == 202
+    job_id = submitted.get_json()["id"]
+    assert submitted.headers["Location"] == f"/api/jobs/{job_id}"
+
+    job = wait_for(app_pythor.job_queue, job_id)
+    assert job["state"] == "done"
+    assert client.get(f"/api/jobs/{job_id}").get_json()["state"] == "done"
+    result = client.get(f"/api/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.data == client.get("/api/weather?" + query("tide_height")).data
+    assert client.delete(f"/api/jobs/{job_id}").get_json()["state"] == "done"
+    assert client.get(f"/api/jobs/{'0' * 32}").status_code == 404
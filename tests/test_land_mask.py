@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+import PyThor.data.land_mask as land_mask
+from PyThor.data.land_mask import LandMaskCache
+
+LAT = np.arange(36, 38.01, 0.25)
+LON = np.arange(14, 16.01, 0.25)
+
+
+def fields():
+    field = np.ones((2, len(LAT), len(LON)))
+    field[:, :3, :3] = np.nan
+    return [field]
+
+
+def counted(monkeypatch):
+    calls = []
+    land_fraction = land_mask.land_fraction
+
+    def count(*args):
+        calls.append(args)
+        return land_fraction(*args)
+
+    monkeypatch.setattr(land_mask, "land_fraction", count)
+    return calls
+
+
+def get(cache, lat_inter, variables=("swh",)):
+    return cache.get("gfswave", list(variables), LAT, LON, fields(), lat_inter, np.arange(14, 16, 0.15), 0.15, 0.5)
+
+
+def test_mask_is_reused_from_memory_and_disk(tmp_path, monkeypatch):
+    calls = counted(monkeypatch)
+    lat_inter = np.arange(36, 38, 0.15)
+    mask = get(LandMaskCache(tmp_path, 1, 1), lat_inter)
+    assert mask[0, 0] and not mask[-1, -1]
+
+    cache = LandMaskCache(tmp_path, 1, 1)
+    assert np.array_equal(get(cache, lat_inter), mask)
+    assert np.array_equal(get(cache, lat_inter), mask)
+    assert len(calls) == 1
+
+    # variables of one dataset may have data over different areas
+    get(cache, lat_inter, ["swh", "ws"])
+    assert len(calls) == 2
+
+
+def test_memory_and_disk_are_bounded(tmp_path, monkeypatch):
+    calls = counted(monkeypatch)
+    # room for about two masks in memory and three on disk
+    size = len(np.arange(36, 38, 0.15)) * len(np.arange(14, 16, 0.15))
+    cache = LandMaskCache(tmp_path, 3.5 * (size + 128) / 2 ** 20, 2.5 * size / 2 ** 20)
+    grids = [np.arange(36 + i / 100, 38 + i / 100, 0.15) for i in range(6)]
+    for lat_inter in grids:
+        get(cache, lat_inter)
+
+    assert len(cache._masks) == 2
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".npy")]) == 3
+    get(cache, grids[-1])
+    assert len(calls) == 6
+    get(cache, grids[0])
+    assert len(calls) == 7
@@ -0,0 +1,140 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import PyThor.app_pythor as app_pythor
+import PyThor.data.sources as sources
+from PyThor.app_pythor import config
+from PyThor.data.data_request import DataRequest
+from PyThor.data.fetcher import Fetcher
+from PyThor.data.sources import RemoteSource
+from tests.conftest import query
+
+
+class NomadsStandIn(BaseHTTPRequestHandler):
+    """
+    serves /file/<name> with keep-alive, /busy/<name> fails with 503 on its first request, other paths are 404
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            first = all(path != self.path for path, _ in server.requests)
+            server.requests.append((self.path, self.client_address[1]))
+        if self.path.startswith("/file/") or (self.path.startswith("/busy/") and not first):
+            self.reply(200, self.path.rsplit("/", 1)[1].encode())
+        elif self.path.startswith("/busy/"):
+            self.reply(503, b"busy")
+        else:
+            self.reply(404, b"not found")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def nomads(monkeypatch):
+    """
+    :return: base url of a local HTTP stand-in of the NOMADS server, see NomadsStandIn
+    """
+    monkeypatch.setitem(config.settings["fetching"], "backoff", 0)
+    monkeypatch.setattr(sources, "_noaa_session", None)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NomadsStandIn)
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    if sources._noaa_session is not None:
+        sources._noaa_session.close()
+
+
+def download(url):
+    return {"url": url, "filename": url.rsplit("/", 1)[1]}
+
+
+def test_downloads_reuse_pooled_connection(nomads):
+    server, url = nomads
+    source = RemoteSource()
+    contents = [source.noaa_download(download(f"{url}/file/f{h:03d}")) for h in range(3)]
+
+    assert contents == [b"f000", b"f001", b"f002"]
+    assert len({port for _, port in server.requests}) == 1
+
+
+def test_failed_download_is_retried(nomads):
+    server, url = nomads
+    assert RemoteSource().noaa_download(download(f"{url}/busy/f004")) == b"f004"
+    assert [path for path, _ in server.requests] == ["/busy/f004", "/busy/f004"]
+
+
+def test_missing_file_returns_none(nomads):
+    _, url = nomads
+    assert RemoteSource().noaa_download(download(f"{url}/missing/f005")) is None
+
+
+def test_hours_are_downloaded_concurrently(synthetic, monkeypatch):
+    monkeypatch.setattr(synthetic, "latency", 0.2)
+    start = int(time.time()) // 3600 * 3600
+    started = time.monotonic()
+    res = Fetcher(DataRequest(36, 37, 15, 16, start, start + 6 * 3600, 60, ["wave_height"])).fetch_wave_and_wind()
+
+    # one file for every hour of the output times, the last one is before the end
+    assert len(res["time"]) == 6
+    assert res["missing"] == []
+    assert time.monotonic() - started < 6 * 0.2
+
+
+def test_missing_hours_are_reported_and_not_cached(synthetic, client, monkeypatch):
+    gap = int(time.time()) // 3600 * 3600 + 3 * 3600
+    download_hour = synthetic.noaa_download
+    monkeypatch.setattr(synthetic, "noaa_download", lambda d: None if d["valid"] == gap else download_hour(d))
+    response = client.get("/api/weather?" + query("wave_height"))
+
+    assert response.status_code == 200
+    weather = response.get_json()
+    assert weather["missing_hours"] == [gap]
+    assert np.isfinite(np.array(weather["wave_height"], dtype=float)).any()
+    start = gap - 3 * 3600
+    key = DataRequest(36, 37, 15, 16, start, start + 6 * 3600, 60, ["wave_height"]).cache_key()
+    assert app_pythor.result_cache.load(key) is None
+
+
+def test_failing_hour_only_misses_itself(synthetic, monkeypatch):
+    start = int(time.time()) // 3600 * 3600
+    bad = start + 2 * 3600
+    download_hour = synthetic.noaa_download
+
+    def download(d):
+        if d["valid"] == bad:
+            raise KeyError("url")
+        return download_hour(d)
+
+    monkeypatch.setattr(synthetic, "noaa_download", download)
+    res = Fetcher(DataRequest(36, 37, 15, 16, start, start + 6 * 3600, 60, ["wave_height"])).fetch_wave_and_wind()
+
+    assert res["missing"] == [bad]
+    assert len(res["time"]) == 5
+    assert bad not in res["time"]
+
+
+def test_complete_result_is_cached(synthetic, client):
+    response = client.get("/api/weather?" + query("wave_height"))
+
+    assert response.status_code == 200
+    assert "missing_hours" not in response.get_json()
+    start = int(time.time()) // 3600 * 3600
+    key = DataRequest(36, 37, 15, 16, start, start + 6 * 3600, 60, ["wave_height"]).cache_key()
+    assert app_pythor.result_cache.load(key) is not None
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import PyThor.app_pythor as app_pythor
+from PyThor.data.data_request import DataRequest
+from PyThor.data.prefetch import Prefetcher
+
+# 2024-05-11 00:00 UTC
+DAY = 1715385600
+REGION = {"name": "sicily", "latitude": [36, 37], "longitude": [15, 16], "variables": ["tide_height"], "interval": 60}
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def wait(prefetcher):
+    prefetcher.executor.shutdown(wait=True)
+
+
+def test_cycle_is_prefetched_once_published():
+    clock = Clock(DAY + 9 * 3600)
+    calls = []
+    prefetcher = Prefetcher([REGION], lambda request, time: calls.append(time) or b"{}", 24, 4, 300, 1, clock)
+
+    # 06z is published at 10:00
+    assert prefetcher.check()
+    assert not prefetcher.check()
+    clock.now = DAY + 10 * 3600
+    assert prefetcher.check()
+    wait(prefetcher)
+
+    assert calls == [[DAY, DAY + 24 * 3600], [DAY + 6 * 3600, DAY + 30 * 3600]]
+    report = prefetcher.report()
+    assert report["cycle"] == DAY + 6 * 3600
+    assert report["regions"]["sicily"]["state"] == "done"
+    assert report["regions"]["sicily"]["cycle"] == DAY + 6 * 3600
+
+
+def test_failures_are_reported_per_region():
+    regions = [dict(REGION, name="empty"), dict(REGION, name="broken", latitude=[38, 39]),
+               dict(REGION, name="invalid", latitude=[37, 36])]
+
+    def compute(request, time):
+        if request.get_coordinates()["latitude"] == [38, 39]:
+            raise RuntimeError("source unavailable")
+        return None
+
+    prefetcher = Prefetcher(regions, compute, 24, 4, 300, 2, Clock(DAY + 12 * 3600))
+    prefetcher.check()
+    wait(prefetcher)
+
+    status = prefetcher.report()["regions"]
+    assert (status["empty"]["state"], status["empty"]["error"]) == ("failed", "no data available")
+    assert (status["broken"]["state"], status["broken"]["error"]) == ("failed", "source unavailable")
+    assert (status["invalid"]["state"], status["invalid"]["error"]) == ("failed", "invalid region")
+
+
+def test_region_still_running_skips_the_next_cycle():
+    clock = Clock(DAY + 10 * 3600)
+    release = threading.Event()
+    calls = []
+
+    def compute(request, time):
+        calls.append(time)
+        release.wait(5)
+        return b"{}"
+
+    prefetcher = Prefetcher([REGION], compute, 24, 4, 300, 1, clock)
+    prefetcher.check()
+    while prefetcher.report()["regions"]["sicily"]["state"] != "running":
+        time.sleep(0.01)
+    clock.now += 6 * 3600
+    assert prefetcher.check()
+    release.set()
+    wait(prefetcher)
+
+    assert calls == [[DAY + 6 * 3600, DAY + 30 * 3600]]
+    assert prefetcher.report()["regions"]["sicily"]["cycle"] == DAY + 6 * 3600
+
+
+def test_prefetched_region_is_served_from_cache(synthetic, client):
+    prefetcher = Prefetcher([REGION], app_pythor.fetch_and_interpolate, 6, 4, 300, 1)
+    prefetcher.check()
+    wait(prefetcher)
+    cycle = prefetcher.report()["cycle"]
+
+    assert prefetcher.report()["regions"]["sicily"]["state"] == "done"
+    key = DataRequest(36, 37, 15, 16, cycle, cycle + 6 * 3600, 60, ["tide_height"]).cache_key()
+    assert app_pythor.result_cache.load(key) is not None
+    response = client.get(f"/api/weather?latitude_start=36&latitude_end=37&longitude_start=15&longitude_end=16"
+                          f"&variables=tide_height&time_start={cycle}&time_end={cycle + 6 * 3600}")
+    assert response.status_code == 200
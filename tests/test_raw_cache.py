@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import PyThor.data.fetcher as fetcher
+from PyThor.data.data_request import DataRequest
+from PyThor.data.fetcher import Fetcher
+from PyThor.data.interpolation import interpolate
+from PyThor.data.raw_cache import RawDataCache
+
+VARIABLES = ["tide_height", "sea_current_speed", "sea_current_direction"]
+
+
+def weather(latitude, longitude, offset=0):
+    start = int(time.time()) // 3600 * 3600 + offset
+    request = DataRequest(latitude[0], latitude[1], longitude[0], longitude[1], start, start + 12 * 3600, 60,
+                          VARIABLES)
+    result = Fetcher(request).fetch()
+    assert result["errors"] == {}
+    return interpolate(result, request, [start, start + 12 * 3600])
+
+
+def assert_same(expected, actual):
+    assert sorted(expected) == sorted(actual)
+    for key in expected:
+        assert np.array_equal(np.asarray(expected[key]), np.asarray(actual[key]), equal_nan=True), key
+
+
+def test_cached_pieces_match_the_source(synthetic, monkeypatch, tmp_path):
+    areas = [((36, 37.5), (14.5, 16)), ((36.5, 38), (15, 17)), ((35.2, 36.4), (14.1, 15.3))]
+    direct = [weather(*area, offset=1800) for area in areas]
+
+    cache = RawDataCache(tmp_path / "Raw", 256, 1.0, 24, 6, 4)
+    monkeypatch.setattr(fetcher, "raw_cache", cache)
+    # overlapping requests fill and read the same tiles concurrently
+    with ThreadPoolExecutor(max_workers=len(areas)) as executor:
+        cached = list(executor.map(lambda area: weather(*area, offset=1800), areas))
+    for expected, actual in zip(direct, cached):
+        assert_same(expected, actual)
+    assert cache.stats()["misses"] > 0
+
+    # everything is served from the cache now
+    assert_same(direct[0], weather(*areas[0], offset=1800))
+
+
+def test_missing_tiles_are_fetched_once_per_chunk(raw_cache, monkeypatch):
+    calls = []
+    open_area = Fetcher.open_area
+
+    def counted(self, dataset_id, *args):
+        calls.append(dataset_id)
+        return open_area(self, dataset_id, *args)
+
+    monkeypatch.setattr(fetcher.Fetcher, "open_area", counted)
+    weather((36, 38.5), (14, 17.5))
+    first = len(calls)
+    # tiles of 1 degree, chunks of 24 hours: at most two chunks for each of the two datasets
+    assert 0 < first <= 4
+
+    weather((36, 38.5), (14, 17.5))
+    assert len(calls) == first
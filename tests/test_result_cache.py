@@ -0,0 +1,125 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from PyThor.data.result_cache import ALIGNMENT, ResultCache, encode
+
+CYCLE = 1_767_225_600
+
+
+def result():
+    time = np.array([0, 3600, 7200], dtype="int64")
+    lat, lon = np.linspace(36, 37, 4), np.linspace(15, 16, 5)
+    height = np.sin(time[:, None, None] + lat[None, :, None] * lon[None, None, :])
+    height[1, 2, 3] = np.nan
+    return {"time_inter": time, "lat_inter": lat, "lon_inter": lon, "tide_height": height,
+            "missing_hours": np.array([], dtype="int64")}
+
+
+def test_encode_matches_json_dumps():
+    arrays = result()
+
+    assert b"".join(encode(arrays)) == json.dumps({k: v.tolist() for k, v in arrays.items()}).encode()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    result cache with a 1 MB disk limit and no memory tier, in the forecast cycle CYCLE until changed
+    """
+    cache = ResultCache(tmp_path, 1, 0, 6, 4)
+    monkeypatch.setattr(cache, "current_cycle", lambda: CYCLE)
+    return cache
+
+
+def test_forecast_result_expires_with_the_next_cycle(cache, monkeypatch):
+    cache.save("forecast", result(), CYCLE + 3600)
+    cache.save("past", result(), CYCLE - 3600)
+    assert cache.load("forecast") is not None
+
+    monkeypatch.setattr(cache, "current_cycle", lambda: CYCLE + 6 * 3600)
+    assert cache.load("forecast") is None
+    assert not (cache.folder / "forecast.result").exists()
+    # results computed from past data only are not replaced by a new cycle
+    assert cache.load("past") is not None
+    assert cache.stats() == {"memory_hits": 0, "hits": 2, "misses": 1}
+
+
+def test_least_recently_used_results_are_evicted(cache):
+    big = {"values": np.zeros(400_000 // 8)}
+    for key in ("a", "b"):
+        cache.save(key, big, CYCLE)
+    os.utime(cache.folder / "a.result", (1, 1))
+    os.utime(cache.folder / "b.result", (2, 2))
+    cache.load("a")
+    cache.save("c", big, CYCLE)
+
+    assert sorted(f.name for f in cache.folder.iterdir()) == ["a.result", "c.result"]
+
+
+def in_memory(tmp_path, monkeypatch, results):
+    """
+    :return: result cache whose memory tier holds the given number of results
+    """
+    body = b"".join(encode(result()))
+    cache = ResultCache(tmp_path, 1, results * len(body) / 1024 / 1024, 6, 4)
+    monkeypatch.setattr(cache, "current_cycle", lambda: CYCLE)
+    return cache
+
+
+def test_hot_results_are_served_from_memory(tmp_path, monkeypatch):
+    cache = in_memory(tmp_path, monkeypatch, 2)
+    body = cache.save("a", result(), CYCLE)
+    os.remove(tmp_path / "a.result")
+
+    assert cache.load("a") == body
+    assert cache.stats() == {"memory_hits": 1, "hits": 0, "misses": 0}
+
+
+def test_memory_tier_keeps_the_most_recently_used(tmp_path, monkeypatch):
+    cache = in_memory(tmp_path, monkeypatch, 2)
+    for key in ("a", "b"):
+        cache.save(key, result(), CYCLE)
+    cache.load("a")
+    cache.save("c", result(), CYCLE)
+    for key in ("a", "c", "b"):
+        cache.load(key)
+
+    # b was dropped from memory and is read from disk
+    assert cache.stats() == {"memory_hits": 3, "hits": 1, "misses": 0}
+
+
+def test_expired_results_are_not_served_from_memory(tmp_path, monkeypatch):
+    cache = in_memory(tmp_path, monkeypatch, 2)
+    cache.save("a", result(), CYCLE + 3600)
+    monkeypatch.setattr(cache, "current_cycle", lambda: CYCLE + 6 * 3600)
+
+    assert cache.load("a") is None
+    assert cache.stats()["memory_hits"] == 0
+
+
+def test_stored_arrays_are_memory_mapped_back(cache):
+    arrays = result()
+    body = cache.save("a", arrays, CYCLE, {"variables": ["tide_height"]})
+    header, stored = ResultCache(cache.folder, 1, 0, 6, 4).arrays("a")
+
+    assert header["coverage"] == {"variables": ["tide_height"]}
+    assert list(stored) == list(arrays)
+    for name, value in arrays.items():
+        assert stored[name].dtype == value.dtype and stored[name].shape == value.shape
+        assert np.array_equal(stored[name], value, equal_nan=True)
+    assert isinstance(stored["tide_height"], np.memmap)
+    assert all(spec["offset"] % ALIGNMENT == 0 for spec in header["arrays"].values())
+    # larger than the memory tier, the result is encoded while it is sent
+    assert b"".join(cache.load("a")) == body
+
+
+def test_damaged_file_is_a_miss(cache):
+    cache.save("a", result(), CYCLE)
+    with open(cache.folder / "a.result", "r+b") as f:
+        f.write(b"garbage")
+
+    assert cache.load("a") is None
+    assert cache.stats()["misses"] == 1
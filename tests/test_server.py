@@ -0,0 +1,83 @@
+import runpy
+import sys
+
+import pytest
+
+import PyThor
+import PyThor.app_pythor as app_pythor
+from PyThor.app_pythor import config
+from PyThor.data.single_flight import hold_lock
+
+
+class PrefetcherStandIn:
+    def __init__(self):
+        self.started = 0
+
+    def start(self):
+        self.started += 1
+
+
+@pytest.fixture
+def prefetcher(monkeypatch, tmp_path):
+    prefetcher = PrefetcherStandIn()
+    monkeypatch.setattr(app_pythor, "prefetcher", prefetcher)
+    monkeypatch.setattr(app_pythor, "cache_folder", tmp_path)
+    monkeypatch.setattr(app_pythor, "_prefetch_lock", None)
+    return prefetcher
+
+
+def test_lock_has_a_single_holder(tmp_path):
+    held = hold_lock(tmp_path / "task.lock")
+    assert held is not None
+    assert hold_lock(tmp_path / "task.lock") is None
+    held.close()
+    again = hold_lock(tmp_path / "task.lock")
+    assert again is not None
+    again.close()
+
+
+def test_prefetcher_starts_in_one_process(prefetcher):
+    app_pythor.startPrefetcher()
+    app_pythor.startPrefetcher()
+    assert prefetcher.started == 1
+
+
+def test_prefetcher_is_left_to_the_process_holding_the_lock(prefetcher, tmp_path):
+    # a lock file held through another open file behaves like one held by another worker process
+    held = hold_lock(tmp_path / "prefetch.lock")
+    app_pythor.startPrefetcher()
+    held.close()
+
+    assert prefetcher.started == 0
+
+
+@pytest.mark.parametrize("argv, call", [
+    ([], ("run", None, None)),
+    (["-a", "0.0.0.0", "-p", "8000"], ("run", "0.0.0.0", 8000)),
+    (["--production", "-w", "2", "-t", "3"], ("serve", None, None, 2, 3)),
+])
+def test_command_line_chooses_the_server(monkeypatch, argv, call):
+    calls = []
+    monkeypatch.setattr(PyThor, "runPythor", lambda *args: calls.append(("run",) + args))
+    monkeypatch.setattr(PyThor, "servePythor", lambda *args: calls.append(("serve",) + args))
+    monkeypatch.setattr(sys, "argv", ["PyThor"] + argv)
+    runpy.run_module("PyThor", run_name="__main__")
+
+    assert calls == [call]
+
+
+def test_production_server_preloads_the_app(monkeypatch):
+    base = pytest.importorskip("gunicorn.app.base")
+    settings = {}
+
+    def run(server):
+        settings.update({key: server.cfg.settings[key].get() for key in ("bind", "workers", "threads",
+                                                                           "worker_class", "preload_app")})
+        settings["app"] = server.load()
+
+    monkeypatch.setattr(base.BaseApplication, "run", run)
+    monkeypatch.setattr(app_pythor.os, "name", "posix")
+    app_pythor.servePythor(None, 8000, None, 3)
+
+    assert settings == {"bind": ["127.0.0.1:8000"], "workers": config.settings["server"]["workers"], "threads": 3,
+                        "worker_class": "gthread", "preload_app": True, "app": app_pythor.app}
@@ -0,0 +1,95 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import PyThor.app_pythor as app_pythor
+from PyThor.data.fetcher import Fetcher
+from PyThor.data.single_flight import SingleFlight, hold_lock
+from tests.conftest import query
+
+
+class Tracker:
+    """
+    counts how many threads are inside a claim at the same time
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def run(self, flight, key, seconds=0.1):
+        with flight.claim(key):
+            with self._lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(seconds)
+            with self._lock:
+                self.active -= 1
+
+
+def stripe(key, stripes):
+    return int(hashlib.sha1(key.encode()).hexdigest(), 16) % stripes
+
+
+def test_identical_keys_are_claimed_one_at_a_time(tmp_path):
+    flight, tracker = SingleFlight(tmp_path, 64, 10), Tracker()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: tracker.run(flight, "key"), range(4)))
+
+    assert tracker.max_active == 1
+
+
+def test_different_keys_are_claimed_concurrently(tmp_path):
+    flight, tracker = SingleFlight(tmp_path, 64, 10), Tracker()
+    keys = []
+    for key in map(str, range(100)):
+        if stripe(key, 64) not in {stripe(k, 64) for k in keys}:
+            keys.append(key)
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda key: tracker.run(flight, key), keys[:4]))
+
+    assert tracker.max_active == 4
+
+
+def test_claim_waits_for_another_process(tmp_path):
+    flight = SingleFlight(tmp_path, 4, 10)
+    # a lock file held through another open file behaves like one held by another process
+    held = hold_lock(tmp_path / f"flight_{stripe('key', 4)}.lock")
+    threading.Timer(0.3, held.close).start()
+    started = time.monotonic()
+    with flight.claim("key"):
+        assert time.monotonic() - started >= 0.3
+
+
+def test_waiting_gives_up_after_the_timeout(tmp_path, capsys):
+    flight = SingleFlight(tmp_path, 4, 0.2)
+    holder = threading.Thread(target=Tracker().run, args=(flight, "key", 1.0))
+    holder.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with flight.claim("key"):
+        waited = time.monotonic() - started
+    holder.join()
+
+    assert 0.2 <= waited < 0.8
+    assert "Waiting for an identical request timed out" in capsys.readouterr().out
+
+
+def test_identical_requests_are_computed_once(client, monkeypatch):
+    fetches = []
+
+    class CountingFetcher(Fetcher):
+        def fetch(self):
+            fetches.append(1)
+            time.sleep(0.2)
+            return super().fetch()
+
+    monkeypatch.setattr(app_pythor, "Fetcher", CountingFetcher)
+    with ThreadPoolExecutor(4) as executor:
+        responses = list(executor.map(lambda _: client.get("/api/weather?" + query("tide_height")), range(4)))
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.data for r in responses}) == 1
+    assert len(fetches) == 1
@@ -0,0 +1,30 @@
+import numpy as np
+
+from PyThor.data.source_data import SourceData
+from tests.conftest import CURRENTS, CountingSource, make_source
+
+
+def currents(source):
+    dataset = source.dataset(CURRENTS).sel(latitude=slice(36, 37), longitude=slice(15, 16))
+    return SourceData(source.cache_id(CURRENTS), dataset.isel(time=slice(0, 6)))
+
+
+def test_axes_are_numpy_arrays():
+    data = currents(make_source())
+
+    assert isinstance(data.latitude, np.ndarray) and isinstance(data.longitude, np.ndarray)
+    assert data.time.dtype == np.int64
+    assert np.all(np.diff(data.time) == 6 * 3600)
+    assert data.variables == ["uo", "vo"]
+
+
+def test_values_take_the_surface_of_the_selected_steps():
+    source = make_source(CountingSource)
+    data = currents(source)
+    assert source.steps == []
+
+    selected = data.values("uo", [1, 4])
+    assert source.steps == [2]
+    every = data.values("uo")
+    assert selected.shape == (2, len(data.latitude), len(data.longitude))
+    assert np.array_equal(selected, every[[1, 4]], equal_nan=True)
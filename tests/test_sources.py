@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from PyThor.data.sources import DataSource, RemoteSource, SyntheticSource, get_data_source
+from tests.conftest import TIDE, CURRENTS, WIND
+
+
+def synthetic(seed=0):
+    return SyntheticSource([30.0, 45.0], [5.0, 25.0], 1, 1, 0.0, seed)
+
+
+def values(source, dataset_id, variable):
+    return source.dataset(dataset_id)[variable].isel(time=slice(0, 3)).values
+
+
+def test_data_source_is_abstract():
+    class Incomplete(DataSource):
+        def dataset(self, dataset_id):
+            return None
+
+    with pytest.raises(TypeError):
+        DataSource()
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_backend_is_chosen_by_the_config():
+    settings = {"backend": "synthetic", "synthetic": {"latitude": [36.0, 38.0], "longitude": [14.0, 16.0],
+                                                      "past_days": 1, "forecast_days": 1, "latency": 0.0, "seed": 3}}
+
+    assert isinstance(get_data_source(settings), SyntheticSource)
+    assert get_data_source(settings).cache_id(TIDE) == f"synthetic-3-{TIDE}"
+    assert isinstance(get_data_source(dict(settings, backend="remote")), RemoteSource)
+
+
+def test_synthetic_data_is_deterministic():
+    for dataset_id, variable in ((TIDE, "zos"), (CURRENTS, "uo"), (WIND, "eastward_wind")):
+        first = values(synthetic(), dataset_id, variable)
+        assert np.array_equal(first, values(synthetic(), dataset_id, variable), equal_nan=True)
+        assert not np.allclose(first, values(synthetic(1), dataset_id, variable), equal_nan=True)
+        # land is NaN, the sea is not
+        assert np.isnan(first).any() and np.isfinite(first).any()
+
+
+def test_synthetic_grids_match_the_real_datasets():
+    tide = synthetic().dataset(TIDE)
+    currents = synthetic().dataset(CURRENTS)
+
+    assert np.allclose(np.diff(tide["latitude"].values), 1 / 12)
+    assert np.allclose(np.diff(synthetic().dataset(WIND)["longitude"].values), 0.125)
+    tide_time = tide["time"].values.astype("datetime64[s]").astype("int64")
+    assert np.all(tide_time % 3600 == 1800)
+    assert np.all(currents["time"].values.astype("datetime64[s]").astype("int64") % (6 * 3600) == 0)
+    assert currents["uo"].dims == ("time", "depth", "latitude", "longitude")
+    with pytest.raises(ValueError):
+        synthetic().dataset("unknown")
+
+
+def test_synthetic_noaa_file_decodes_on_the_requested_area():
+    download = {"area": {"latitude": [36.0, 37.0], "longitude": [15.0, 16.0]}, "variables": ["var_HTSGW=on"],
+                "valid": 7200, "lead": 2}
+    grib = synthetic().noaa_decode(synthetic().noaa_download(download))
+
+    assert grib["time"] == 0
+    assert grib["latitude"][0] > grib["latitude"][-1]
+    assert list(grib["fields"]) == ["swh"]
+    assert grib["fields"]["swh"].shape == (len(grib["latitude"]), len(grib["longitude"]))
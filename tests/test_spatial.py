@@ -0,0 +1,114 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import PyThor.data.spatial as spatial
+from PyThor.data.spatial import ENGINES, estimate_memory, mask_groups, plan_tiles, tiled_interpolation
+
+LAT = np.arange(36.0, 37.01, 0.125)
+LON = np.arange(15.0, 16.01, 0.125)
+
+
+def field(lat, lon, t=0):
+    return np.sin(np.deg2rad(8 * lat + t)) + np.cos(np.deg2rad(6 * lon - t))
+
+
+def slices(times=(0,)):
+    lat, lon = np.meshgrid(LAT, LON, indexing="ij")
+    return np.stack([field(lat, lon, t) for t in times])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_reproduces_source_points(engine):
+    res = tiled_interpolation(engine, slices(), LAT, LON, LAT[2:6], LON[3:7])
+
+    assert np.allclose(res[0], slices()[0][2:6, 3:7], atol=1e-6)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_interpolates_between_source_points(engine):
+    lat_inter, lon_inter = LAT[2:-2] + 0.0625, LON[2:-2] + 0.0625
+    res = tiled_interpolation(engine, slices(), LAT, LON, lat_inter, lon_inter)
+
+    expected = field(*np.meshgrid(lat_inter, lon_inter, indexing="ij"))
+    # the closest source point is half a grid step away for nearest
+    assert np.abs(res[0] - expected).max() < (0.02 if engine == "nearest" else 5e-3)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_skips_missing_source_points(engine):
+    data = slices((0, 10))
+    data[:, :3, :3] = np.nan
+    data[1, :] = np.nan
+    res = tiled_interpolation(engine, data, LAT, LON, LAT[4:7], LON[4:7])
+
+    assert np.allclose(res[0], slices()[0][4:7, 4:7], atol=1e-6)
+    assert np.isnan(res[1]).all()
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        tiled_interpolation("cubic", slices(), LAT, LON, LAT[2:4], LON[2:4])
+
+
+@pytest.fixture
+def factorizations(monkeypatch):
+    """
+    start from an empty solver cache and count the thin plate systems factorized
+    :return: list of the sizes of the factorized systems
+    """
+    monkeypatch.setattr(spatial, "_solver_cache", OrderedDict())
+    sizes = []
+    lu_factor = spatial.lu_factor
+
+    def counting(matrix, *args, **kwargs):
+        sizes.append(len(matrix))
+        return lu_factor(matrix, *args, **kwargs)
+
+    monkeypatch.setattr(spatial, "lu_factor", counting)
+    return sizes
+
+
+def test_slices_sharing_a_mask_are_factorized_once(factorizations):
+    data = slices(range(0, 40, 5))
+    data[4:, 0, 0] = np.nan
+    tiled_interpolation("thin_plate", data, LAT, LON, LAT[2:6], LON[2:6])
+    tiled_interpolation("thin_plate", data, LAT, LON, LAT[3:7], LON[3:7])
+
+    # one system per NaN pattern, reused for another output grid
+    assert factorizations == [LAT.size * LON.size, LAT.size * LON.size - 1]
+
+
+def test_shared_solve_matches_solving_every_slice_alone(factorizations):
+    data = slices(range(0, 40, 5))
+    together = tiled_interpolation("thin_plate", data, LAT, LON, LAT[2:6] + 0.05, LON[2:6] + 0.05)
+    alone = np.concatenate([tiled_interpolation("thin_plate", data[i:i + 1], LAT, LON, LAT[2:6] + 0.05,
+                                                LON[2:6] + 0.05) for i in range(len(data))])
+
+    assert np.allclose(together, alone, rtol=0, atol=1e-10)
+    assert len(factorizations) == 1
+
+
+def test_mask_groups_split_by_nan_pattern():
+    data = slices(range(5))
+    data[[1, 3], 0, 0] = np.nan
+    data[4] = np.nan
+
+    assert sorted(g.tolist() for g in mask_groups(data)) == [[0, 2], [1, 3], [4]]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tiled_output_matches_untiled(engine):
+    lat, lon = np.arange(35.0, 38.01, 0.125), np.arange(14.0, 17.01, 0.125)
+    lat_grid, lon_grid = np.meshgrid(lat, lon, indexing="ij")
+    data = np.stack([field(lat_grid, lon_grid, t) for t in (0, 10)])
+    lat_inter, lon_inter = np.arange(35.5, 37.5, 0.05), np.arange(14.5, 16.5, 0.05)
+    # a tenth of the memory needed to interpolate the whole area at once
+    budget = estimate_memory(engine, lat.size * lon.size, lat_inter.size * lon_inter.size, len(data)) // 10
+    untiled = tiled_interpolation(engine, data, lat, lon, lat_inter, lon_inter)
+    tiled = tiled_interpolation(engine, data, lat, lon, lat_inter, lon_inter, memory_budget=budget, halo=0.5)
+
+    assert np.prod(plan_tiles(engine, lat, lon, lat_inter, lon_inter, len(data), 16, budget, 0.5)) > 1
+    # the local engines only use source points inside the halo, the global fit changes slightly
+    assert np.abs(tiled - untiled).max() <= (1e-4 if engine == "thin_plate" else 0.0)